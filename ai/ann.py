@@ -0,0 +1,333 @@
+import os
+import threading
+
+import numpy as np
+from django.conf import settings
+
+from .embeddings import get_embedding_provider
+from .models import CourseEmbedding
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+class IVFIndex:
+    """Inverted-file approximate nearest-neighbour index over unit vectors.
+
+    Vectors are clustered with spherical k-means; a query only scores the
+    vectors assigned to the ``n_probe`` closest centroids. Each item also
+    carries ``is_published``, ``level`` and ``category`` so searches can be
+    filtered without touching the database. Deletes are tombstones that are
+    compacted away once they make up a large share of the index.
+    """
+
+    def __init__(self, dim, n_lists=1, n_probe=8):
+        self.dim = dim
+        self.n_probe = n_probe
+        self.centroids = np.zeros((n_lists, dim), dtype=np.float32)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.assignments = np.empty(0, dtype=np.int32)
+        self.alive = np.empty(0, dtype=bool)
+        self.published = np.empty(0, dtype=bool)
+        self.levels = np.empty(0, dtype=np.int32)
+        self.categories = np.empty(0, dtype=np.int32)
+        self.level_names = []
+        self.category_names = []
+        self._rows = {}
+
+    def __len__(self):
+        return len(self._rows)
+
+    @classmethod
+    def build(cls, ids, vectors, published, levels, categories, n_lists=None,
+              n_probe=8, iterations=10, seed=0):
+        """Cluster ``vectors`` and return a populated index."""
+        vectors = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+        n, dim = vectors.shape
+        if n_lists is None:
+            n_lists = int(np.sqrt(n))
+        n_lists = max(1, min(n_lists, n))
+
+        index = cls(dim, n_lists=n_lists, n_probe=n_probe)
+        index.centroids = index._train(vectors, n_lists, iterations, seed)
+        index.level_names = sorted(set(levels))
+        index.category_names = sorted(set(categories))
+        level_codes = {name: code for code, name in enumerate(index.level_names)}
+        category_codes = {name: code for code, name in enumerate(index.category_names)}
+
+        index.ids = np.asarray(ids, dtype=np.int64)
+        index.vectors = vectors
+        index.assignments = index._assign(vectors)
+        index.alive = np.ones(n, dtype=bool)
+        index.published = np.asarray(published, dtype=bool)
+        index.levels = np.asarray([level_codes[level] for level in levels], dtype=np.int32)
+        index.categories = np.asarray([category_codes[c] for c in categories], dtype=np.int32)
+        index._rows = {int(item_id): row for row, item_id in enumerate(index.ids)}
+        return index
+
+    @staticmethod
+    def _train(vectors, n_lists, iterations, seed):
+        rng = np.random.default_rng(seed)
+        sample = vectors
+        if len(vectors) > n_lists * 256:
+            sample = vectors[rng.choice(len(vectors), n_lists * 256, replace=False)]
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = ~np.bincount(labels, minlength=n_lists).astype(bool)
+            sums[empty] = centroids[empty]
+            centroids = _normalize_rows(sums)
+        return centroids
+
+    def _assign(self, vectors):
+        if not len(vectors):
+            return np.empty(0, dtype=np.int32)
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    def _code(self, names, value):
+        try:
+            return names.index(value)
+        except ValueError:
+            names.append(value)
+            return len(names) - 1
+
+    def upsert(self, item_id, vector, published=True, level='', category=''):
+        """Insert an item, or update its vector and metadata in place."""
+        vector = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+        if vector.shape[1] != self.dim:
+            raise ValueError(f"Expected a {self.dim}-dim vector, got {vector.shape[1]}")
+        vector = _normalize_rows(vector)
+        assignment = self._assign(vector)[0]
+        level_code = self._code(self.level_names, level)
+        category_code = self._code(self.category_names, category)
+
+        row = self._rows.get(item_id)
+        if row is not None:
+            self.vectors[row] = vector[0]
+            self.assignments[row] = assignment
+            self.published[row] = published
+            self.levels[row] = level_code
+            self.categories[row] = category_code
+            return
+
+        self._rows[item_id] = len(self.ids)
+        self.ids = np.append(self.ids, np.int64(item_id))
+        self.vectors = np.vstack([self.vectors, vector])
+        self.assignments = np.append(self.assignments, np.int32(assignment))
+        self.alive = np.append(self.alive, True)
+        self.published = np.append(self.published, bool(published))
+        self.levels = np.append(self.levels, np.int32(level_code))
+        self.categories = np.append(self.categories, np.int32(category_code))
+
+    def update_metadata(self, item_id, published=None, level=None, category=None):
+        """Change an item's filter fields without touching its vector."""
+        row = self._rows.get(item_id)
+        if row is None:
+            return False
+        if published is not None:
+            self.published[row] = published
+        if level is not None:
+            self.levels[row] = self._code(self.level_names, level)
+        if category is not None:
+            self.categories[row] = self._code(self.category_names, category)
+        return True
+
+    def remove(self, item_id):
+        """Tombstone an item; compacts once a third of the rows are dead."""
+        row = self._rows.pop(item_id, None)
+        if row is None:
+            return
+        self.alive[row] = False
+        if (~self.alive).sum() * 3 > len(self.alive):
+            self.compact()
+
+    def compact(self):
+        """Drop tombstoned rows."""
+        keep = self.alive
+        for name in ('ids', 'vectors', 'assignments', 'alive', 'published', 'levels', 'categories'):
+            setattr(self, name, getattr(self, name)[keep])
+        self._rows = {int(item_id): row for row, item_id in enumerate(self.ids)}
+
+    def search(self, vector, k, published=True, level=None, category=None, n_probe=None):
+        """Return up to ``k`` ``(item_id, score)`` pairs matching the filters."""
+        query = np.asarray(vector, dtype=np.float32)
+        if k <= 0 or not len(self._rows) or query.shape[0] != self.dim:
+            return []
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        mask = self.alive.copy()
+        if published is not None:
+            mask &= self.published == published
+        if level is not None:
+            if level not in self.level_names:
+                return []
+            mask &= self.levels == self.level_names.index(level)
+        if category is not None:
+            if category not in self.category_names:
+                return []
+            mask &= self.categories == self.category_names.index(category)
+
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        probe = np.argpartition(-(self.centroids @ query), n_probe - 1)[:n_probe]
+        rows = np.flatnonzero(mask & np.isin(self.assignments, probe))
+        if len(rows) < k:
+            # Selective filters can leave the probed lists short; scan them all
+            rows = np.flatnonzero(mask)
+        if not len(rows):
+            return []
+
+        scores = self.vectors[rows] @ query
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.ids[rows[i]]), float(scores[i])) for i in top]
+
+    def save(self, path):
+        """Write the index to ``path`` atomically as a ``.npz`` archive."""
+        self.compact()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            centroids=self.centroids,
+            ids=self.ids,
+            vectors=self.vectors,
+            assignments=self.assignments,
+            published=self.published,
+            levels=self.levels,
+            categories=self.categories,
+            level_names=np.asarray(self.level_names, dtype=str),
+            category_names=np.asarray(self.category_names, dtype=str),
+            n_probe=np.asarray(self.n_probe),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load an index written by :meth:`save`."""
+        with np.load(path) as data:
+            centroids = data['centroids']
+            index = cls(centroids.shape[1], n_lists=len(centroids), n_probe=int(data['n_probe']))
+            index.centroids = centroids
+            index.ids = data['ids']
+            index.vectors = data['vectors']
+            index.assignments = data['assignments']
+            index.published = data['published']
+            index.levels = data['levels']
+            index.categories = data['categories']
+            index.level_names = data['level_names'].tolist()
+            index.category_names = data['category_names'].tolist()
+        index.alive = np.ones(len(index.ids), dtype=bool)
+        index._rows = {int(item_id): row for row, item_id in enumerate(index.ids)}
+        return index
+
+
+class CourseANNIndex:
+    """Process-wide IVF index over ``CourseEmbedding`` rows.
+
+    Loaded from ``AI_ANN_INDEX_PATH`` (or built from the database when no file
+    exists), patched in place by signals, and reloaded whenever another
+    process writes a newer index file.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or getattr(
+            settings, 'AI_ANN_INDEX_PATH',
+            os.path.join(settings.BASE_DIR, 'indexes', 'course_ann.npz'),
+        )
+        self._lock = threading.RLock()
+        self._index = None
+        self._mtime = None
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def load(self):
+        """Load the persisted index if one exists; returns True on success."""
+        mtime = self._file_mtime()
+        if mtime is None:
+            return False
+        index = IVFIndex.load(self.path)
+        with self._lock:
+            self._index, self._mtime = index, mtime
+        return True
+
+    def build(self, save=True, **kwargs):
+        """Rebuild the index from the database."""
+        dim = get_embedding_provider().dim
+        rows = [
+            row for row in CourseEmbedding.objects.values_list(
+                'course_id', 'embedding_vector', 'course__is_published', 'course__level', 'course__category'
+            ).iterator()
+            # Skip vectors embedded by a previously configured provider
+            if not dim or len(row[1]) == dim
+        ]
+        if not rows:
+            with self._lock:
+                self._index = None
+            return None
+
+        ids, vectors, published, levels, categories = zip(*rows)
+        kwargs.setdefault('n_probe', getattr(settings, 'AI_ANN_N_PROBE', 8))
+        index = IVFIndex.build(ids, np.vstack(vectors), published, levels, categories, **kwargs)
+        if save:
+            index.save(self.path)
+        with self._lock:
+            self._index, self._mtime = index, self._file_mtime()
+        return index
+
+    def get(self):
+        """Return the current index, loading or building it when needed."""
+        with self._lock:
+            index, mtime = self._index, self._mtime
+        current_mtime = self._file_mtime()
+        if current_mtime is not None and current_mtime != mtime and self.load():
+            index = self._index
+
+        # Rebuild when the index was made with a different embedding provider
+        dim = get_embedding_provider().dim
+        if index is None or (dim and index.dim != dim):
+            return self.build()
+        return index
+
+    def search(self, vector, k, **filters):
+        index = self.get()
+        if index is None:
+            return []
+        with self._lock:
+            return index.search(vector, k, **filters)
+
+    def upsert(self, course, vector):
+        with self._lock:
+            if self._index is None:
+                return
+            try:
+                self._index.upsert(course.pk, vector, course.is_published, course.level, course.category)
+            except ValueError:
+                self._index = None  # Embedding dimension changed; rebuild from the database
+
+    def update_course(self, course):
+        with self._lock:
+            if self._index is not None:
+                self._index.update_metadata(
+                    course.pk, published=course.is_published, level=course.level, category=course.category
+                )
+
+    def remove(self, course_id):
+        with self._lock:
+            if self._index is not None:
+                self._index.remove(course_id)
+
+
+course_ann_index = CourseANNIndex()
@@ -0,0 +1,138 @@
+import re
+import threading
+import unicodedata
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max
+from courses.models import Lesson
+
+from .cache import TTLCache
+from .embeddings import get_embedding_provider
+
+PUNCTUATION_RE = re.compile(r"[^\w\s]")
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_question(text):
+    """Canonical form of a question: case, punctuation and spacing folded."""
+    text = unicodedata.normalize('NFKC', text).lower()
+    text = PUNCTUATION_RE.sub(' ', text)
+    return WHITESPACE_RE.sub(' ', text).strip()
+
+
+class CourseAnswerCache:
+    """Cache of first-turn chatbot answers, shared by everyone in a course.
+
+    Answers are keyed on the course, the course's content version and the
+    normalized question, in a TTL/LRU cache. When ``similarity`` is set,
+    questions are also embedded and a miss falls back to the most similar
+    cached question of the same course if it scores at least ``similarity``.
+    The version is read from the course's lessons (their count and latest
+    ``updated_at``), so a lesson edit in any process retires older answers in
+    every process; they are never served again and simply age out.
+    """
+
+    def __init__(self, maxsize=None, ttl=None, similarity=None, max_vectors_per_course=1000):
+        self._answers = TTLCache(
+            maxsize=maxsize or getattr(settings, 'AI_CHAT_CACHE_SIZE', 5000),
+            ttl=ttl or getattr(settings, 'AI_CHAT_CACHE_TTL', 24 * 60 * 60),
+        )
+        self.similarity = similarity if similarity is not None else getattr(settings, 'AI_CHAT_CACHE_SIMILARITY', None)
+        self.max_vectors_per_course = max_vectors_per_course
+        self._vectors = {}  # course_id -> (version, questions, unit-vector matrix)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'similar_hits': 0, 'misses': 0, 'stores': 0, 'invalidations': 0}
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    @staticmethod
+    def version(course_id):
+        """Content version of ``course_id``, derived from its lessons."""
+        lessons = Lesson.objects.filter(course_id=course_id).aggregate(count=Count('pk'), updated=Max('updated_at'))
+        return lessons['count'], lessons['updated']
+
+    def _embed(self, question):
+        vectors, _ = get_embedding_provider().embed([question])
+        vector = np.asarray(vectors[0], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, course_id, question):
+        """Return the cached answer for ``question`` in ``course_id``, or None."""
+        question = normalize_question(question)
+        version = self.version(course_id)
+        answer = self._answers.get((course_id, version, question))
+        if answer is not None:
+            self._count('hits')
+            return answer
+
+        if self.similarity:
+            answer = self._get_similar(course_id, version, question)
+            if answer is not None:
+                self._count('similar_hits')
+                return answer
+        self._count('misses')
+        return None
+
+    def _get_similar(self, course_id, version, question):
+        with self._lock:
+            vectors_version, questions, matrix = self._vectors.get(course_id, (None, (), None))
+        if matrix is None or not len(questions) or vectors_version != version:
+            return None
+        try:
+            vector = self._embed(question)
+        except Exception:
+            return None
+        if vector.shape[0] != matrix.shape[1]:
+            return None
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity:
+            return None
+        return self._answers.get((course_id, version, questions[best]))
+
+    def set(self, course_id, question, answer):
+        """Cache ``answer`` for ``question`` in ``course_id``."""
+        question = normalize_question(question)
+        version = self.version(course_id)
+        key = (course_id, version, question)
+        if self._answers.get(key) is None and self.similarity:
+            try:
+                vector = self._embed(question)
+            except Exception:
+                vector = None
+            if vector is not None:
+                with self._lock:
+                    vectors_version, questions, matrix = self._vectors.get(course_id, (None, (), None))
+                    if matrix is None or matrix.shape[1] != vector.shape[0] or vectors_version != version:
+                        questions, matrix = (), np.empty((0, vector.shape[0]), dtype=np.float32)
+                    questions = (tuple(questions) + (question,))[-self.max_vectors_per_course:]
+                    matrix = np.vstack([matrix, vector])[-self.max_vectors_per_course:]
+                    self._vectors[course_id] = (version, questions, matrix)
+        self._answers.set(key, answer)
+        self._count('stores')
+
+    def invalidate(self, course_id):
+        """Drop this process's question vectors for ``course_id`` early.
+
+        Answers need no invalidation: the lesson change already moved the
+        course to a new version.
+        """
+        with self._lock:
+            self._vectors.pop(course_id, None)
+            self._stats['invalidations'] += 1
+
+    def stats(self):
+        """Counters plus the overall hit rate."""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['similar_hits'] + stats['misses']
+        stats['size'] = len(self._answers)
+        stats['hit_rate'] = (stats['hits'] + stats['similar_hits']) / lookups if lookups else 0.0
+        return stats
+
+
+course_answer_cache = CourseAnswerCache()
@@ -1,8 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 class AiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ai'
 
     def ready(self):
-        import ai.signals  # noqa 
\ No newline at end of file
+        import ai.signals  # noqa
+
+        # Load the persisted course ANN index once per worker process
+        if getattr(settings, 'AI_ANN_PRELOAD', True):
+            from ai.ann import course_ann_index
+            course_ann_index.load() 
\ No newline at end of file
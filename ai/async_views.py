@@ -0,0 +1,147 @@
+"""Async counterparts of the AI endpoints.
+
+These are plain Django async views rather than DRF viewsets, so a request
+waiting on OpenAI only parks a coroutine instead of holding a worker. They
+only pay off when served over ASGI (``SERVER_MODE=asgi`` in ``start.sh``).
+"""
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from courses.models import Enrollment
+from tests.models import Question
+from .models import ChatConversation
+from .serializers import (
+    ChatMessageCreateSerializer, GradeAnswerSerializer, RecommendationSerializer, SpeechRequestSerializer,
+)
+from .services import AIChatbotService, AssessmentService, CourseRecommendationService, VoiceAssistantService
+
+
+def jwt_required(view):
+    """Authenticate the bearer token the same way the DRF views do."""
+    authenticator = JWTAuthentication()
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            result = await sync_to_async(authenticator.authenticate)(request)
+        except AuthenticationFailed as e:
+            return JsonResponse({'detail': str(e.detail)}, status=401)
+        if result is None:
+            return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+        request.user = result[0]
+        return await view(request, *args, **kwargs)
+
+    return csrf_exempt(wrapper)
+
+
+def read_json(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+async def get_conversation(request, pk):
+    return await ChatConversation.objects.filter(user=request.user, pk=pk).afirst()
+
+
+@jwt_required
+@require_POST
+async def chat_message(request, pk):
+    conversation = await get_conversation(request, pk)
+    if conversation is None:
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+    serializer = ChatMessageCreateSerializer(data=read_json(request) or {})
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+
+    response = await AIChatbotService().aget_chat_response(conversation.id, serializer.validated_data['message'])
+    return JsonResponse({'response': response})
+
+
+@jwt_required
+@require_POST
+async def chat_stream(request, pk):
+    """Stream the reply as Server-Sent Events, like ``ChatbotViewSet.stream``."""
+    conversation = await get_conversation(request, pk)
+    if conversation is None:
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+    serializer = ChatMessageCreateSerializer(data=read_json(request) or {})
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+
+    chunks = AIChatbotService().astream_chat_response(conversation.id, serializer.validated_data['message'])
+
+    async def events():
+        async for chunk in chunks:
+            yield f"data: {json.dumps({'delta': chunk})}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@jwt_required
+@require_GET
+async def recommendations(request):
+    try:
+        limit = min(max(int(request.GET.get('limit', 5)), 1), 50)
+    except ValueError:
+        limit = 5
+    level = request.GET.get('level')
+    category = request.GET.get('category')
+
+    service = CourseRecommendationService()
+    if level or category:
+        results = await service.aget_recommendations(request.user, limit, level=level, category=category)
+        computed_at = None
+    else:
+        results, computed_at = await service.aget_cached_recommendations(request.user, limit)
+
+    data = await sync_to_async(lambda: RecommendationSerializer(results, many=True).data)()
+    return JsonResponse({'computed_at': computed_at, 'results': data})
+
+
+@jwt_required
+@require_POST
+async def text_to_speech(request):
+    serializer = SpeechRequestSerializer(data=read_json(request) or {})
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+
+    audio = await VoiceAssistantService().atext_to_speech(**serializer.validated_data)
+    if audio is None:
+        return JsonResponse({'detail': 'Speech synthesis failed.'}, status=502)
+    return HttpResponse(audio, content_type='audio/mpeg')
+
+
+@jwt_required
+@require_POST
+async def grade_answer(request):
+    """Grade one answer to a free-text question of a course the user takes or teaches."""
+    serializer = GradeAnswerSerializer(data=read_json(request) or {})
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+    data = serializer.validated_data
+
+    question = await Question.objects.filter(
+        pk=data['question'], question_type='free_text'
+    ).select_related('test__course').afirst()
+    user = request.user
+    if question is None or not (
+        user.is_staff or question.test.course.instructor_id == user.pk
+        or await Enrollment.objects.filter(student=user, course=question.test.course).aexists()
+    ):
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+
+    result = await AssessmentService().agrade_free_text_answer(question, data['answer'], question.points)
+    return JsonResponse(result)
@@ -0,0 +1,101 @@
+from django.conf import settings
+from .client import get_openai_client
+from .models import ChatConversation, ChatMessage
+from .tokens import MESSAGE_OVERHEAD_TOKENS, estimate_tokens
+
+
+class ConversationHistory:
+    """Token-budgeted conversation window with a rolling summary.
+
+    The newest messages that fit ``budget`` tokens are sent verbatim. When
+    older messages fall out of the window they are folded into
+    ``ChatConversation.summary``, which is sent ahead of the window. Folding
+    keeps only ``keep_ratio`` of the budget verbatim so it runs once every few
+    turns rather than on every turn.
+    """
+
+    def __init__(self, budget=None, keep_ratio=0.5, page_size=20):
+        self.budget = budget or getattr(settings, 'AI_CHAT_HISTORY_TOKEN_BUDGET', 3000)
+        self.keep_ratio = keep_ratio
+        self.page_size = page_size
+
+    def _newest_first(self, conversation):
+        """Yield ``(id, role, content)`` newest first, a keyset page at a time."""
+        queryset = ChatMessage.objects.filter(
+            conversation=conversation, id__gt=conversation.summarized_until
+        ).order_by('-id')
+        cursor = None
+        while True:
+            page_queryset = queryset if cursor is None else queryset.filter(id__lt=cursor)
+            page = list(page_queryset.values_list('id', 'role', 'content')[:self.page_size])
+            yield from page
+            if len(page) < self.page_size:
+                return
+            cursor = page[-1][0]
+
+    def _split(self, conversation, budget):
+        """Return ``(window, boundary_id)``; messages up to ``boundary_id`` do not fit."""
+        window, used = [], 0
+        for message_id, role, content in self._newest_first(conversation):
+            used += estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+            if used > budget:
+                return window[::-1], message_id
+            window.append((message_id, role, content))
+        return window[::-1], None
+
+    def build(self, conversation, user_message):
+        """Return model messages: summary, recent history and ``user_message``."""
+        reserve = estimate_tokens(user_message) + MESSAGE_OVERHEAD_TOKENS
+        budget = max(self.budget - reserve - estimate_tokens(conversation.summary), 0)
+
+        window, boundary = self._split(conversation, budget)
+        if boundary is not None:
+            window, boundary = self._split(conversation, int(budget * self.keep_ratio))
+            self.fold(conversation, boundary)
+
+        messages = []
+        if conversation.summary:
+            messages.append({
+                "role": "system",
+                "content": f"Summary of the earlier conversation: {conversation.summary}",
+            })
+        messages.extend({"role": role, "content": content} for _, role, content in window)
+        messages.append({"role": "user", "content": user_message})
+        return messages
+
+    def fold(self, conversation, until_id):
+        """Fold messages up to ``until_id`` into the conversation summary."""
+        transcript = "\n".join(
+            f"{role}: {content}"
+            for role, content in ChatMessage.objects.filter(
+                conversation=conversation,
+                id__gt=conversation.summarized_until,
+                id__lte=until_id,
+            ).order_by('id').values_list('role', 'content')
+        )
+        try:
+            conversation.summary = self.summarize(conversation.summary, transcript)
+        except Exception:
+            pass  # Keep the previous summary; the folded turns are dropped from the window
+        conversation.summarized_until = until_id
+        ChatConversation.objects.filter(pk=conversation.pk).update(
+            summary=conversation.summary, summarized_until=until_id
+        )
+
+    def summarize(self, summary, transcript):
+        """Extend ``summary`` with ``transcript`` using a small, cheap model."""
+        prompt = f"""Update the running summary of a tutoring conversation.
+        Keep facts, goals and open questions; stay under 200 words.
+
+        Current summary:
+        {summary or '(none)'}
+
+        New messages:
+        {transcript}"""
+
+        return get_openai_client().chat(
+            [{"role": "user", "content": prompt}],
+            model=getattr(settings, 'AI_CHAT_SUMMARY_MODEL', 'gpt-3.5-turbo'),
+            temperature=0.2,
+            max_tokens=300
+        )
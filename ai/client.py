@@ -0,0 +1,374 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import httpx
+from django.conf import settings
+
+from .tokens import estimate_tokens
+
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class OpenAIError(Exception):
+    """An OpenAI API call failed after retries."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class TokenRateLimiter:
+    """Tokens-per-minute budget shared by every call in the process.
+
+    Callers reserve their estimated tokens up front and are told how long to
+    wait; the balance may go negative, which spaces later callers out instead
+    of letting them race for the refill.
+    """
+
+    def __init__(self, tokens_per_minute):
+        self.rate = tokens_per_minute / 60.0
+        self.capacity = float(tokens_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens):
+        """Deduct ``tokens`` and return the number of seconds to wait first."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= min(tokens, self.capacity)
+            return max(0.0, -self.tokens / self.rate)
+
+
+class OpenAIClient:
+    """Pooled HTTP client for the OpenAI REST API.
+
+    One instance is shared per process (see :func:`get_openai_client`). It
+    keeps connections alive, applies a per-call timeout, retries 429/5xx
+    responses and transport errors with jittered exponential backoff
+    (honouring ``Retry-After``), caps in-flight requests with a process-wide
+    semaphore and paces calls against a tokens-per-minute budget. Every
+    endpoint has a blocking method and an ``a``-prefixed coroutine.
+    """
+
+    def __init__(self, api_key=None, base_url=None, timeout=None, max_retries=None,
+                 max_concurrency=None, tokens_per_minute=None, backoff_base=0.5, backoff_cap=20.0):
+        self.api_key = api_key if api_key is not None else settings.OPENAI_API_KEY
+        self.base_url = (base_url or getattr(settings, 'OPENAI_BASE_URL', 'https://api.openai.com/v1')).rstrip('/')
+        self.timeout = timeout or getattr(settings, 'OPENAI_TIMEOUT', 30.0)
+        self.max_retries = max_retries if max_retries is not None else getattr(settings, 'OPENAI_MAX_RETRIES', 4)
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+
+        max_concurrency = max_concurrency or getattr(settings, 'OPENAI_MAX_CONCURRENCY', 16)
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._limits = httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+        if tokens_per_minute is None:
+            tokens_per_minute = getattr(settings, 'OPENAI_TOKENS_PER_MINUTE', 0)
+        self._token_limiter = TokenRateLimiter(tokens_per_minute) if tokens_per_minute else None
+
+        self._client = httpx.Client(base_url=self.base_url, headers=self._headers(), timeout=self.timeout, limits=self._limits)
+        self._async_client = None
+        self._async_loop = None
+        self._async_closer = None
+
+        self.stats = {'requests': 0, 'retries': 0, 'rate_limited': 0, 'failures': 0}
+        self._stats_lock = threading.Lock()
+
+    def _headers(self):
+        return {'Authorization': f"Bearer {self.api_key}"}
+
+    def _get_async_client(self):
+        # AsyncClient connections belong to the loop that opened them
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = httpx.AsyncClient(
+                base_url=self.base_url, headers=self._headers(), timeout=self.timeout, limits=self._limits
+            )
+            self._async_loop = loop
+            # Under WSGI each request runs on a fresh loop, so close the client with its loop
+            self._async_closer = loop.create_task(self._close_with_loop(self._async_client))
+        return self._async_client
+
+    @staticmethod
+    async def _close_with_loop(client):
+        """Wait until the loop cancels leftover tasks on shutdown, then close ``client`` on it."""
+        try:
+            await asyncio.Future()
+        finally:
+            await client.aclose()
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    # Retry policy
+
+    def _backoff(self, attempt, response=None):
+        """Seconds to wait before retry ``attempt`` (0-based)."""
+        if response is not None:
+            retry_after = self._retry_after(response)
+            if retry_after is not None:
+                # Spread out callers that were all told the same moment
+                return min(retry_after, self.backoff_cap) + random.uniform(0, self.backoff_base * 2 ** attempt)
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    @staticmethod
+    def _retry_after(response):
+        value = response.headers.get('retry-after-ms')
+        if value:
+            try:
+                return float(value) / 1000
+            except ValueError:
+                pass
+        value = response.headers.get('retry-after')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                return None
+
+    def _should_retry(self, attempt, response=None):
+        if attempt >= self.max_retries:
+            return False
+        if response is None:
+            return True  # Transport error or timeout
+        if response.status_code == 429:
+            self._count('rate_limited')
+        return response.status_code in RETRY_STATUSES
+
+    @staticmethod
+    def _error(response):
+        try:
+            message = response.json()['error']['message']
+        except (ValueError, KeyError, TypeError):
+            message = response.text[:200]
+        return OpenAIError(f"OpenAI API error {response.status_code}: {message}", response.status_code)
+
+    # Concurrency and rate limiting
+
+    def _acquire_sync(self, tokens):
+        if self._token_limiter and tokens:
+            delay = self._token_limiter.reserve(tokens)
+            if delay:
+                time.sleep(delay)
+        self._semaphore.acquire()
+
+    async def _acquire_async(self, tokens):
+        if self._token_limiter and tokens:
+            delay = self._token_limiter.reserve(tokens)
+            if delay:
+                await asyncio.sleep(delay)
+        # Poll rather than block so waiting never ties up the event loop or a thread
+        wait = 0.001
+        while not self._semaphore.acquire(blocking=False):
+            await asyncio.sleep(wait)
+            wait = min(wait * 2, 0.05)
+
+    # Core request loops
+
+    def request(self, path, payload, tokens=0, timeout=None):
+        """POST ``payload`` to ``path`` and return the successful ``httpx.Response``."""
+        attempt = 0
+        while True:
+            self._acquire_sync(tokens)
+            try:
+                self._count('requests')
+                response = self._client.post(path, json=payload, timeout=timeout or self.timeout)
+            except httpx.TransportError as e:
+                response, error = None, e
+            finally:
+                self._semaphore.release()
+
+            if response is not None and response.status_code < 400:
+                return response
+            if not self._should_retry(attempt, response):
+                self._count('failures')
+                if response is None:
+                    raise OpenAIError(f"OpenAI API request failed: {error}") from error
+                raise self._error(response)
+            self._count('retries')
+            time.sleep(self._backoff(attempt, response))
+            attempt += 1
+
+    async def arequest(self, path, payload, tokens=0, timeout=None):
+        """Async counterpart of :meth:`request`."""
+        client = self._get_async_client()
+        attempt = 0
+        while True:
+            await self._acquire_async(tokens)
+            try:
+                self._count('requests')
+                response = await client.post(path, json=payload, timeout=timeout or self.timeout)
+            except httpx.TransportError as e:
+                response, error = None, e
+            finally:
+                self._semaphore.release()
+
+            if response is not None and response.status_code < 400:
+                return response
+            if not self._should_retry(attempt, response):
+                self._count('failures')
+                if response is None:
+                    raise OpenAIError(f"OpenAI API request failed: {error}") from error
+                raise self._error(response)
+            self._count('retries')
+            await asyncio.sleep(self._backoff(attempt, response))
+            attempt += 1
+
+    def _stream_response(self, path, payload, tokens):
+        """Open a streaming POST, retrying until the response status is OK."""
+        attempt = 0
+        while True:
+            self._acquire_sync(tokens)
+            try:
+                self._count('requests')
+                request = self._client.build_request('POST', path, json=payload)
+                response = self._client.send(request, stream=True)
+            except httpx.TransportError as e:
+                self._semaphore.release()
+                response, error = None, e
+            else:
+                if response.status_code < 400:
+                    return response  # Semaphore is released when the stream closes
+                response.read()
+                response.close()
+                self._semaphore.release()
+
+            if not self._should_retry(attempt, response):
+                self._count('failures')
+                if response is None:
+                    raise OpenAIError(f"OpenAI API request failed: {error}") from error
+                raise self._error(response)
+            self._count('retries')
+            time.sleep(self._backoff(attempt, response))
+            attempt += 1
+
+    async def _astream_response(self, path, payload, tokens):
+        client = self._get_async_client()
+        attempt = 0
+        while True:
+            await self._acquire_async(tokens)
+            try:
+                self._count('requests')
+                request = client.build_request('POST', path, json=payload)
+                response = await client.send(request, stream=True)
+            except httpx.TransportError as e:
+                self._semaphore.release()
+                response, error = None, e
+            else:
+                if response.status_code < 400:
+                    return response
+                await response.aread()
+                await response.aclose()
+                self._semaphore.release()
+
+            if not self._should_retry(attempt, response):
+                self._count('failures')
+                if response is None:
+                    raise OpenAIError(f"OpenAI API request failed: {error}") from error
+                raise self._error(response)
+            self._count('retries')
+            await asyncio.sleep(self._backoff(attempt, response))
+            attempt += 1
+
+    @staticmethod
+    def _parse_event(line):
+        """Return the content delta carried by one SSE line, if any."""
+        if not line.startswith('data:'):
+            return None
+        data = line[5:].strip()
+        if not data or data == '[DONE]':
+            return None
+        choices = json.loads(data).get('choices') or [{}]
+        return choices[0].get('delta', {}).get('content')
+
+    # Endpoints
+
+    @staticmethod
+    def _chat_tokens(messages, max_tokens):
+        return sum(estimate_tokens(message['content']) for message in messages) + (max_tokens or 0)
+
+    def chat(self, messages, model='gpt-4', **params):
+        """Create a chat completion and return the reply text."""
+        payload = {'model': model, 'messages': messages, **params}
+        response = self.request('/chat/completions', payload, self._chat_tokens(messages, params.get('max_tokens')))
+        return response.json()['choices'][0]['message']['content']
+
+    async def achat(self, messages, model='gpt-4', **params):
+        payload = {'model': model, 'messages': messages, **params}
+        response = await self.arequest('/chat/completions', payload, self._chat_tokens(messages, params.get('max_tokens')))
+        return response.json()['choices'][0]['message']['content']
+
+    def chat_stream(self, messages, model='gpt-4', **params):
+        """Yield the reply text of a streamed chat completion piece by piece."""
+        payload = {'model': model, 'messages': messages, 'stream': True, **params}
+        response = self._stream_response('/chat/completions', payload, self._chat_tokens(messages, params.get('max_tokens')))
+        try:
+            for line in response.iter_lines():
+                delta = self._parse_event(line)
+                if delta:
+                    yield delta
+        finally:
+            response.close()
+            self._semaphore.release()
+
+    async def achat_stream(self, messages, model='gpt-4', **params):
+        payload = {'model': model, 'messages': messages, 'stream': True, **params}
+        response = await self._astream_response('/chat/completions', payload, self._chat_tokens(messages, params.get('max_tokens')))
+        try:
+            async for line in response.aiter_lines():
+                delta = self._parse_event(line)
+                if delta:
+                    yield delta
+        finally:
+            await response.aclose()
+            self._semaphore.release()
+
+    def embeddings(self, texts, model='text-embedding-ada-002'):
+        """Embed ``texts``; returns the decoded response body."""
+        tokens = sum(estimate_tokens(text) for text in texts)
+        return self.request('/embeddings', {'model': model, 'input': texts}, tokens).json()
+
+    async def aembeddings(self, texts, model='text-embedding-ada-002'):
+        tokens = sum(estimate_tokens(text) for text in texts)
+        return (await self.arequest('/embeddings', {'model': model, 'input': texts}, tokens)).json()
+
+    def speech(self, text, model='tts-1', voice='alloy', response_format='mp3'):
+        """Synthesize ``text`` and return the audio bytes."""
+        payload = {'model': model, 'voice': voice, 'input': text, 'response_format': response_format}
+        return self.request('/audio/speech', payload).content
+
+    async def aspeech(self, text, model='tts-1', voice='alloy', response_format='mp3'):
+        payload = {'model': model, 'voice': voice, 'input': text, 'response_format': response_format}
+        return (await self.arequest('/audio/speech', payload)).content
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_openai_client():
+    """Return the process-wide :class:`OpenAIClient`.
+
+    A forked worker gets its own client so pooled sockets are never shared
+    across processes.
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = OpenAIClient()
+            _client_pid = os.getpid()
+        return _client
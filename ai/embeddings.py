@@ -0,0 +1,127 @@
+import math
+import re
+import threading
+import zlib
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .client import get_openai_client
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+class EmbeddingProvider:
+    """Interface for turning texts into embedding vectors.
+
+    ``name`` identifies the provider and model; it is folded into content
+    hashes so switching providers re-embeds everything. ``dim`` is the
+    length of the vectors it returns.
+    """
+    name = ''
+    dim = None
+
+    def embed(self, texts):
+        """Embed ``texts`` in one call; returns ``(vectors, total_tokens)``."""
+        raise NotImplementedError
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """Embeddings from the OpenAI API."""
+
+    def __init__(self, model='text-embedding-ada-002', dim=1536):
+        self.model = model
+        self.dim = dim
+        self.name = f"openai:{model}"
+
+    def embed(self, texts):
+        response = get_openai_client().embeddings(texts, model=self.model)
+        vectors = [None] * len(texts)
+        for item in response['data']:
+            vectors[item['index']] = item['embedding']
+        return vectors, response.get('usage', {}).get('total_tokens', 0)
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """Local feature-hashed TF-IDF embeddings computed in-process on the CPU.
+
+    Unigrams and bigrams are hashed into ``dim`` signed buckets with
+    sublinear term frequency, optionally weighted by bucket IDF values loaded
+    from ``idf_path`` (see :meth:`fit_idf`), and L2-normalized.
+    """
+
+    def __init__(self, dim=512, idf_path=None):
+        self.dim = dim
+        self.name = f"hashing:{dim}"
+        self.idf = None
+        if idf_path:
+            self.idf = np.load(idf_path).astype(np.float32)
+            self.name += f":{zlib.crc32(self.idf.tobytes()):08x}"
+
+    def _features(self, text):
+        tokens = TOKEN_RE.findall(text.lower())
+        return tokens, tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def _buckets(self, features):
+        indices, signs = [], []
+        for feature in features:
+            h = zlib.crc32(feature.encode('utf-8'))
+            indices.append(h % self.dim)
+            signs.append(1.0 if h & 0x80000000 else -1.0)
+        return indices, signs
+
+    def embed(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        total_tokens = 0
+        for row, text in enumerate(texts):
+            tokens, features = self._features(text)
+            total_tokens += len(tokens)
+            counts = Counter(features)
+            indices, signs = self._buckets(counts)
+            weights = [sign * (1 + math.log(count)) for sign, count in zip(signs, counts.values())]
+            np.add.at(matrix[row], indices, weights)
+
+        if self.idf is not None:
+            matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        matrix /= norms
+        return list(matrix), total_tokens
+
+    def fit_idf(self, texts, path=None):
+        """Compute smoothed bucket IDF weights from ``texts``, optionally saving them."""
+        document_frequency = np.zeros(self.dim, dtype=np.float64)
+        for text in texts:
+            indices, _ = self._buckets(set(self._features(text)[1]))
+            document_frequency[np.unique(indices)] += 1
+        idf = np.log((1 + len(texts)) / (1 + document_frequency)) + 1
+        if path:
+            np.save(path, idf.astype(np.float32))
+        return idf
+
+
+PROVIDERS = {
+    'openai': OpenAIEmbeddingProvider,
+    'local': HashingEmbeddingProvider,
+}
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_embedding_provider():
+    """Return the process-wide provider configured by ``AI_EMBEDDING_PROVIDER``.
+
+    The setting is ``'openai'``, ``'local'`` or a dotted path to an
+    :class:`EmbeddingProvider` subclass; ``AI_EMBEDDING_OPTIONS`` are passed
+    to its constructor.
+    """
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            backend = getattr(settings, 'AI_EMBEDDING_PROVIDER', 'openai')
+            provider_class = PROVIDERS.get(backend) or import_string(backend)
+            _provider = provider_class(**getattr(settings, 'AI_EMBEDDING_OPTIONS', {}))
+        return _provider
@@ -0,0 +1,73 @@
+import base64
+
+import numpy as np
+from django.db import models
+
+
+def encode_vector(vector, dtype='float32'):
+    """Pack a 1-D vector into bytes using ``dtype`` storage.
+
+    ``int8`` vectors are symmetrically quantized and prefixed with their
+    float32 scale factor.
+    """
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    if dtype == 'int8':
+        scale = float(np.abs(vector).max()) / 127 if vector.size else 0.0
+        quantized = np.round(vector / scale) if scale else np.zeros_like(vector)
+        return np.float32(scale).tobytes() + quantized.astype(np.int8).tobytes()
+    return vector.astype(dtype).tobytes()
+
+
+def decode_vector(data, dtype='float32'):
+    """Load bytes written by :func:`encode_vector` as a float32 NumPy array."""
+    if dtype == 'int8':
+        scale = np.frombuffer(data, dtype=np.float32, count=1)[0]
+        return np.frombuffer(data, dtype=np.int8, offset=4).astype(np.float32) * scale
+    vector = np.frombuffer(data, dtype=dtype)
+    return vector if dtype == 'float32' else vector.astype(np.float32)
+
+
+class VectorField(models.BinaryField):
+    """Binary column holding a dense vector, loaded as a NumPy array.
+
+    Values are stored as packed ``float32`` by default, or quantized to
+    ``float16``/``int8``. Reads go straight through ``np.frombuffer`` with
+    no per-element Python objects; float32 reads are zero-copy and read-only.
+    """
+
+    DTYPES = ('float32', 'float16', 'int8')
+
+    def __init__(self, *args, dtype='float32', **kwargs):
+        if dtype not in self.DTYPES:
+            raise ValueError(f"Unsupported vector dtype {dtype!r}; expected one of {self.DTYPES}")
+        self.dtype = dtype
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.dtype != 'float32':
+            kwargs['dtype'] = self.dtype
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return decode_vector(value, self.dtype)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, np.ndarray):
+            return value
+        if isinstance(value, str):
+            value = base64.b64decode(value.encode('ascii'))
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return decode_vector(value, self.dtype)
+        return np.asarray(value, dtype=np.float32)
+
+    def get_prep_value(self, value):
+        if value is None or isinstance(value, (bytes, bytearray, memoryview)):
+            return value
+        return encode_vector(value, self.dtype)
+
+    def value_to_string(self, obj):
+        value = self.get_prep_value(self.value_from_object(obj))
+        return None if value is None else base64.b64encode(value).decode('ascii')
@@ -0,0 +1,164 @@
+import hashlib
+import threading
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .answer_cache import normalize_question as normalize_answer
+from .embeddings import get_embedding_provider
+from .models import GradingCacheEntry
+
+
+def _sha256(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class GradingCache:
+    """Database-backed cache of AI grades for free-text answers.
+
+    Entries are keyed on the question, a hash of its text, its maximum points
+    and a hash of the normalized answer, so grades are shared across attempts
+    and an edited question never reuses old grades. With ``similarity`` set,
+    an exact miss can also reuse the grade of the closest cached answer to
+    the same question if their embeddings score at least ``similarity``.
+    """
+
+    def __init__(self, similarity=None, max_candidates=500):
+        self.similarity = similarity if similarity is not None else getattr(settings, 'AI_GRADING_CACHE_SIMILARITY', None)
+        self.max_candidates = max_candidates
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'similar_hits': 0, 'misses': 0, 'stores': 0}
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self._stats[key] += n
+
+    @staticmethod
+    def key(question, text, max_points):
+        return (question.pk, _sha256(question.text), max_points, _sha256(normalize_answer(text)))
+
+    def _embed(self, texts):
+        vectors, _ = get_embedding_provider().embed([normalize_answer(text) for text in texts])
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return matrix / norms
+
+    def get_many(self, items):
+        """Look up ``(question, text, max_points)`` items; returns ``{index: grade}``."""
+        if not items:
+            return {}
+        keys = [self.key(*item) for item in items]
+        rows = GradingCacheEntry.objects.filter(
+            question_id__in={key[0] for key in keys}, answer_hash__in={key[3] for key in keys}
+        ).values_list('pk', 'question_id', 'question_hash', 'max_points', 'answer_hash', 'points', 'feedback')
+        cached = {row[1:5]: (row[0], {'points': row[5], 'feedback': row[6]}) for row in rows}
+
+        results, hit_pks, misses = {}, set(), []
+        for index, key in enumerate(keys):
+            if key in cached:
+                pk, results[index] = cached[key]
+                hit_pks.add(pk)
+            else:
+                misses.append(index)
+        self._count('hits', len(results))
+
+        if misses and self.similarity:
+            similar = self._get_similar([items[i] for i in misses], [keys[i] for i in misses])
+            for position, (pk, grade) in similar.items():
+                results[misses[position]] = grade
+                hit_pks.add(pk)
+            self._count('similar_hits', len(similar))
+        self._count('misses', len(items) - len(results))
+
+        if hit_pks:
+            GradingCacheEntry.objects.filter(pk__in=hit_pks).update(hits=F('hits') + 1, last_hit_at=timezone.now())
+        return results
+
+    def _get_similar(self, items, keys):
+        try:
+            vectors = self._embed([text for _, text, _ in items])
+        except Exception:
+            return {}
+
+        groups = defaultdict(list)
+        for position, key in enumerate(keys):
+            groups[key[:3]].append(position)
+
+        results = {}
+        for (question_id, question_hash, max_points), positions in groups.items():
+            candidates = list(
+                GradingCacheEntry.objects.filter(
+                    question_id=question_id, question_hash=question_hash,
+                    max_points=max_points, answer_vector__isnull=False,
+                ).order_by('-hits').values_list('pk', 'answer_vector', 'points', 'feedback')[:self.max_candidates]
+            )
+            candidates = [row for row in candidates if len(row[1]) == vectors.shape[1]]
+            if not candidates:
+                continue
+            matrix = np.vstack([row[1] for row in candidates])
+            scores = vectors[positions] @ matrix.T
+            for position, row_scores in zip(positions, scores):
+                best = int(np.argmax(row_scores))
+                if row_scores[best] >= self.similarity:
+                    pk, _, points, feedback = candidates[best]
+                    results[position] = (pk, {'points': points, 'feedback': feedback})
+        return results
+
+    def set_many(self, items, grades, overwrite=False):
+        """Store ``grades[i]`` for each ``(question, text, max_points)`` item.
+
+        Existing entries are kept unless ``overwrite`` is set, as for regrades.
+        """
+        if not items:
+            return
+        vectors = [None] * len(items)
+        if self.similarity:
+            try:
+                vectors = list(self._embed([text for _, text, _ in items]))
+            except Exception:
+                pass
+        entries = [
+            GradingCacheEntry(
+                question_id=question_id, question_hash=question_hash, max_points=max_points,
+                answer_hash=answer_hash, answer_vector=vector,
+                points=grade['points'], feedback=grade['feedback'],
+            )
+            for (question_id, question_hash, max_points, answer_hash), vector, grade
+            in zip((self.key(*item) for item in items), vectors, grades)
+        ]
+        if overwrite:
+            GradingCacheEntry.objects.bulk_create(
+                entries, update_conflicts=True,
+                unique_fields=['question', 'question_hash', 'max_points', 'answer_hash'],
+                update_fields=['answer_vector', 'points', 'feedback'],
+            )
+        else:
+            GradingCacheEntry.objects.bulk_create(entries, ignore_conflicts=True)
+        self._count('stores', len(entries))
+
+    def get(self, question, text, max_points):
+        return self.get_many([(question, text, max_points)]).get(0)
+
+    def set(self, question, text, max_points, grade):
+        self.set_many([(question, text, max_points)], [grade])
+
+    def invalidate_question(self, question):
+        """Drop entries graded against an older version of ``question``."""
+        GradingCacheEntry.objects.filter(question=question).exclude(
+            question_hash=_sha256(question.text), max_points=question.points
+        ).delete()
+
+    def stats(self):
+        """Counters of this process plus the overall hit rate."""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['similar_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['similar_hits']) / lookups if lookups else 0.0
+        return stats
+
+
+grading_cache = GradingCache()
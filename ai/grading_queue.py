@@ -0,0 +1,116 @@
+"""Database-backed queue of AI grading jobs.
+
+Requests only enqueue a ``GradingJob``; the ``grading_worker`` command claims
+pending jobs, grades their answers and records the attempt score. Claiming
+uses ``SELECT ... FOR UPDATE SKIP LOCKED`` where the database supports it,
+so several workers never pick the same job. SQLite has no row locks and
+serializes writes, so there a conditional ``UPDATE ... WHERE status =
+'pending'`` tagged with a claim token does the same job.
+"""
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from tests.models import Answer
+from .models import GradingJob
+from .services import AssessmentService
+
+
+def enqueue(attempt, regrade=False):
+    """Queue grading of ``attempt``, reusing a job that has not started yet."""
+    with transaction.atomic():
+        job = GradingJob.objects.filter(attempt=attempt, status=GradingJob.PENDING).first()
+        if job is None:
+            return GradingJob.objects.create(attempt=attempt, regrade=regrade)
+        if regrade and not job.regrade:
+            job.regrade = True
+            job.save(update_fields=['regrade'])
+    return job
+
+
+def claim(limit):
+    """Mark up to ``limit`` pending jobs as running and return them."""
+    token = uuid.uuid4().hex
+    values = {
+        'status': GradingJob.RUNNING, 'claim_token': token,
+        'claimed_at': timezone.now(), 'tries': F('tries') + 1,
+    }
+    pending = GradingJob.objects.filter(status=GradingJob.PENDING).order_by('created_at')
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(pending.select_for_update(skip_locked=True).values_list('pk', flat=True)[:limit])
+            GradingJob.objects.filter(pk__in=ids).update(**values)
+    else:
+        ids = list(pending.values_list('pk', flat=True)[:limit])
+        # Jobs another worker claimed in the meantime no longer match
+        GradingJob.objects.filter(pk__in=ids, status=GradingJob.PENDING).update(**values)
+
+    return list(GradingJob.objects.filter(claim_token=token, status=GradingJob.RUNNING).select_related('attempt'))
+
+
+def requeue_stale(timeout=None):
+    """Return jobs whose worker died mid-run to the queue."""
+    timeout = timeout or getattr(settings, 'AI_GRADING_JOB_TIMEOUT', 600)
+    return GradingJob.objects.filter(
+        status=GradingJob.RUNNING, claimed_at__lt=timezone.now() - timedelta(seconds=timeout)
+    ).update(status=GradingJob.PENDING, claim_token='')
+
+
+def update_score(attempt):
+    """Store the attempt's score as the percentage of available points earned."""
+    total = attempt.test.questions.aggregate(total=Sum('points'))['total']
+    earned = Answer.objects.filter(attempt=attempt).aggregate(earned=Sum('points_earned'))['earned']
+    attempt.score = (Decimal(earned or 0) * 100 / total).quantize(Decimal('0.01')) if total else None
+    attempt.save(update_fields=['score'])
+
+
+def process(jobs, service=None, max_tries=None):
+    """Grade the answers of all ``jobs`` together and record the outcome.
+
+    Answers from every claimed attempt share one ``grade_answers`` call (one
+    more for regrades, which bypass the cache), so batches and the grading
+    cache span attempts. A job whose answers all got
+    a grade is done; otherwise it goes back to the queue until it has been
+    tried ``max_tries`` times.
+    """
+    if not jobs:
+        return
+    service = service or AssessmentService()
+    max_tries = max_tries or getattr(settings, 'AI_GRADING_JOB_MAX_TRIES', 3)
+
+    answers = Answer.objects.filter(
+        attempt__in=[job.attempt for job in jobs], question__question_type='free_text'
+    ).select_related('question')
+    regrade = {job.attempt_id for job in jobs if job.regrade}
+    answers = [
+        answer for answer in answers.order_by('attempt_id', 'question__order')
+        if answer.attempt_id in regrade or answer.points_earned is None
+    ]
+    try:
+        failed = set()
+        for regrading in (False, True):
+            result = service.grade_answers(
+                [answer for answer in answers if (answer.attempt_id in regrade) == regrading], regrade=regrading
+            )
+            failed.update(answer.attempt_id for answer in result['failed'])
+        error = 'Some answers could not be graded.'
+    except Exception as e:
+        failed = {job.attempt_id for job in jobs}
+        error = str(e)
+
+    for job in jobs:
+        if job.attempt_id not in failed:
+            update_score(job.attempt)
+            values = {'status': GradingJob.DONE, 'error': '', 'finished_at': timezone.now()}
+        elif job.tries >= max_tries:
+            values = {'status': GradingJob.FAILED, 'error': error, 'finished_at': timezone.now()}
+        else:
+            # A regrade keeps its flag: its failed answers still hold their old grades
+            values = {'status': GradingJob.PENDING, 'error': error}
+        # A job requeued as stale meanwhile belongs to another claim now
+        GradingJob.objects.filter(pk=job.pk, claim_token=job.claim_token).update(claim_token='', **values)
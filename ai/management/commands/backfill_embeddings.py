@@ -0,0 +1,147 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from courses.models import Course
+from ai.ann import course_ann_index
+from ai.models import CourseEmbedding, EmbeddingBackfillCheckpoint, UserEmbedding
+from ai.scoring import course_embedding_matrix
+from ai.services import CourseRecommendationService
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Populate CourseEmbedding and UserEmbedding rows in resumable, batched chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=['courses', 'users', 'all'], default='all')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Rows read from the database per keyset page.')
+        parser.add_argument('--batch-size', type=int,
+                            default=getattr(settings, 'AI_EMBEDDING_BATCH_SIZE', 100),
+                            help='Inputs sent per embedding request.')
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Embedding requests in flight at once.')
+        parser.add_argument('--reset', action='store_true',
+                            help='Ignore the stored checkpoint and start from the beginning.')
+        parser.add_argument('--force', action='store_true',
+                            help='Re-embed rows even if their content hash is unchanged.')
+
+    def handle(self, *args, **options):
+        self.service = CourseRecommendationService()
+        self.options = options
+
+        targets = {
+            'courses': (
+                Course.objects.only('id', 'title', 'description', 'category', 'level'),
+                CourseEmbedding, 'course', self.service.course_embedding_text,
+            ),
+            'users': (
+                User.objects.only('id', 'interests', 'learning_progress'),
+                UserEmbedding, 'user', self.service.user_embedding_text,
+            ),
+        }
+        names = list(targets) if options['target'] == 'all' else [options['target']]
+        for name in names:
+            self.backfill(name, *targets[name])
+
+    def backfill(self, name, queryset, embedding_model, field, text_for):
+        checkpoint, _ = EmbeddingBackfillCheckpoint.objects.get_or_create(name=name)
+        if self.options['reset']:
+            checkpoint.last_pk = 0
+            checkpoint.processed = 0
+            checkpoint.save()
+        elif checkpoint.last_pk:
+            self.stdout.write(f"{name}: resuming after pk {checkpoint.last_pk}")
+
+        started = time.monotonic()
+        rows = embedded = tokens = 0
+        queryset = queryset.order_by('pk')
+        chunk_size = self.options['chunk_size']
+
+        while True:
+            chunk = list(queryset.filter(pk__gt=checkpoint.last_pk)[:chunk_size])
+            if not chunk:
+                break
+
+            texts = {obj.pk: text_for(obj) for obj in chunk}
+            hashes = {pk: self.service.content_hash(text) for pk, text in texts.items()}
+            stale = list(texts)
+            if not self.options['force']:
+                stored = dict(
+                    embedding_model.objects.filter(**{f'{field}_id__in': texts})
+                    .values_list(f'{field}_id', 'content_hash')
+                )
+                stale = [pk for pk in texts if stored.get(pk) != hashes[pk]]
+
+            vectors, chunk_tokens = self.embed(stale, texts)
+
+            with transaction.atomic():
+                embedding_model.objects.bulk_create(
+                    [
+                        embedding_model(**{
+                            f'{field}_id': pk,
+                            'embedding_vector': vectors[pk],
+                            'content_hash': hashes[pk],
+                        })
+                        for pk in stale
+                    ],
+                    update_conflicts=True,
+                    unique_fields=[field],
+                    update_fields=['embedding_vector', 'content_hash', 'last_updated'],
+                )
+                checkpoint.last_pk = chunk[-1].pk
+                checkpoint.processed += len(chunk)
+                checkpoint.save()
+
+            rows += len(chunk)
+            embedded += len(stale)
+            tokens += chunk_tokens
+            elapsed = max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f"{name}: {rows} rows ({embedded} embedded) up to pk {checkpoint.last_pk} | "
+                f"{rows / elapsed:.1f} rows/s, {tokens / elapsed:.1f} tokens/s"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{name}: done, {rows} rows scanned, {embedded} embedded, {tokens} tokens"
+        ))
+
+        if embedding_model is CourseEmbedding and embedded:
+            # bulk_create bypasses post_save: rewrite the ANN index file so serving
+            # processes reload it, and rebuild the scoring matrix
+            course_ann_index.build()
+            course_embedding_matrix.invalidate()
+            self.stdout.write(f"{name}: rebuilt the ANN index")
+
+    def embed(self, pks, texts):
+        """Embed ``pks`` in concurrent batches; returns ``(vectors_by_pk, tokens)``."""
+        batch_size = self.options['batch_size']
+        batches = [pks[i:i + batch_size] for i in range(0, len(pks), batch_size)]
+        vectors, tokens = {}, 0
+        if not batches:
+            return vectors, tokens
+
+        with ThreadPoolExecutor(max_workers=self.options['concurrency']) as pool:
+            results = pool.map(
+                lambda batch: self.embed_batch([texts[pk] for pk in batch]), batches
+            )
+            for batch, (batch_vectors, batch_tokens) in zip(batches, results):
+                vectors.update(zip(batch, batch_vectors))
+                tokens += batch_tokens
+        return vectors, tokens
+
+    def embed_batch(self, batch):
+        """Embed one batch; the OpenAI client already retries with backoff.
+
+        A batch that still fails stops the command before the chunk's
+        checkpoint is saved, so the next run resumes with it.
+        """
+        try:
+            return self.service.embed_batch(batch)
+        except Exception as e:
+            raise CommandError(f"Embedding request failed: {e}")
@@ -0,0 +1,82 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from ai.ann import IVFIndex
+from ai.models import CourseEmbedding, UserEmbedding
+
+
+class Command(BaseCommand):
+    help = 'Compare recall and latency of the IVF course index against exact scoring.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--synthetic', type=int, default=0,
+                            help='Benchmark on N synthetic clustered vectors instead of the database.')
+        parser.add_argument('--dim', type=int, default=1536)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--n-lists', type=int, default=None)
+        parser.add_argument('--n-probe', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        if options['synthetic']:
+            vectors, queries = self.synthetic(rng, options['synthetic'], options['dim'], options['queries'])
+        else:
+            vectors, queries = self.from_database(rng, options['queries'])
+
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        ids = np.arange(len(vectors))
+        n = len(vectors)
+        k = min(options['k'], n)
+
+        started = time.monotonic()
+        index = IVFIndex.build(ids, vectors, [True] * n, [''] * n, [''] * n, n_lists=options['n_lists'])
+        self.stdout.write(
+            f"{n} vectors x {vectors.shape[1]} dims, {len(index.centroids)} lists, "
+            f"built in {time.monotonic() - started:.2f}s"
+        )
+
+        exact, exact_times = [], []
+        for query in queries:
+            started = time.perf_counter()
+            scores = vectors @ (query / np.linalg.norm(query))
+            top = np.argpartition(-scores, k - 1)[:k]
+            exact_times.append(time.perf_counter() - started)
+            exact.append(set(top.tolist()))
+        self.report('exact', exact_times, 1.0)
+
+        for n_probe in options['n_probe']:
+            hits, times = 0, []
+            for query, truth in zip(queries, exact):
+                started = time.perf_counter()
+                results = index.search(query, k, n_probe=n_probe)
+                times.append(time.perf_counter() - started)
+                hits += len(truth & {item_id for item_id, _ in results})
+            self.report(f"ivf n_probe={n_probe}", times, hits / (k * len(queries)))
+
+    def report(self, label, times, recall):
+        times_ms = np.asarray(times) * 1000
+        self.stdout.write(
+            f"{label:<18} recall@k={recall:.3f}  p50={np.percentile(times_ms, 50):.3f}ms  "
+            f"p95={np.percentile(times_ms, 95):.3f}ms"
+        )
+
+    def synthetic(self, rng, n, dim, n_queries):
+        centers = rng.standard_normal((max(1, n // 100), dim)).astype(np.float32)
+        labels = rng.integers(0, len(centers), n)
+        vectors = centers[labels] + rng.standard_normal((n, dim)).astype(np.float32)
+        queries = centers[rng.integers(0, len(centers), n_queries)]
+        queries = queries + rng.standard_normal(queries.shape).astype(np.float32)
+        return vectors, queries
+
+    def from_database(self, rng, n_queries):
+        vectors = list(CourseEmbedding.objects.values_list('embedding_vector', flat=True).iterator())
+        if not vectors:
+            raise CommandError('No course embeddings found; use --synthetic N instead.')
+        vectors = np.vstack(vectors).astype(np.float32)
+        queries = list(UserEmbedding.objects.values_list('embedding_vector', flat=True)[:n_queries])
+        if not queries:
+            queries = vectors[rng.integers(0, len(vectors), n_queries)]
+        return vectors, np.vstack(queries).astype(np.float32)
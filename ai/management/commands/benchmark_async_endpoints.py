@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+import httpx
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+from ai.models import ChatConversation
+
+ENDPOINTS = {
+    'sync': '/api/ai/chatbot/{pk}/message/',
+    'async': '/api/ai/async/chatbot/{pk}/message/',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Load the sync and async chatbot endpoints of a running server and report '
+        'requests/s and latency per concurrency level. Run the server with one worker '
+        '(WEB_CONCURRENCY=1) and OPENAI_BASE_URL pointing at openai_stub_server, once '
+        'with SERVER_MODE=asgi and once without, to compare capacity per worker.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--username', required=True, help='User to mint a JWT for.')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32, 128])
+        parser.add_argument('--requests', type=int, default=200, help='Requests per concurrency level.')
+        parser.add_argument('--endpoints', nargs='+', choices=sorted(ENDPOINTS), default=['sync', 'async'])
+        parser.add_argument('--timeout', type=float, default=60.0)
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user named {options['username']!r}.")
+        token = str(AccessToken.for_user(user))
+        conversation = ChatConversation.objects.create(user=user)
+
+        try:
+            for endpoint in options['endpoints']:
+                path = ENDPOINTS[endpoint].format(pk=conversation.pk)
+                for concurrency in options['concurrency']:
+                    ok, failed, elapsed, latencies = asyncio.run(
+                        self.load(options['url'] + path, token, concurrency, options['requests'], options['timeout'])
+                    )
+                    latencies_ms = np.asarray(latencies or [0.0]) * 1000
+                    self.stdout.write(
+                        f"{endpoint:<6} c={concurrency:<4} {ok} ok, {failed} failed  "
+                        f"{ok / elapsed:8.1f} req/s  p50={np.percentile(latencies_ms, 50):.0f}ms  "
+                        f"p95={np.percentile(latencies_ms, 95):.0f}ms"
+                    )
+        finally:
+            conversation.delete()
+
+    async def load(self, url, token, concurrency, n_requests, timeout):
+        callers = asyncio.Semaphore(concurrency)
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        headers = {'Authorization': f"Bearer {token}"}
+
+        async with httpx.AsyncClient(headers=headers, timeout=timeout, limits=limits) as client:
+            async def call(i):
+                async with callers:
+                    started = time.monotonic()
+                    try:
+                        response = await client.post(url, json={'message': f"Benchmark question {i}"})
+                    except httpx.HTTPError:
+                        return None
+                    if response.status_code != 200:
+                        return None
+                    return time.monotonic() - started
+
+            started = time.monotonic()
+            results = await asyncio.gather(*(call(i) for i in range(n_requests)))
+            elapsed = time.monotonic() - started
+
+        latencies = [result for result in results if result is not None]
+        return len(latencies), len(results) - len(latencies), elapsed, latencies
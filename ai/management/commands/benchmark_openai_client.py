@@ -0,0 +1,74 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from ai.client import OpenAIClient, OpenAIError
+
+
+class Command(BaseCommand):
+    help = 'Measure OpenAI client throughput and latency, e.g. against openai_stub_server.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default=None, help='Defaults to OPENAI_BASE_URL.')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=32, help='Callers issuing requests at once.')
+        parser.add_argument('--max-concurrency', type=int, default=None, help='Client semaphore size.')
+        parser.add_argument('--tokens-per-minute', type=int, default=None, help='Client-side token budget.')
+        parser.add_argument('--max-tokens', type=int, default=50)
+        parser.add_argument('--async', dest='use_async', action='store_true', help='Use the asyncio entry points.')
+
+    def handle(self, *args, **options):
+        client = OpenAIClient(
+            base_url=options['base_url'],
+            max_concurrency=options['max_concurrency'],
+            tokens_per_minute=options['tokens_per_minute'],
+        )
+        messages = [{'role': 'user', 'content': 'Summarize the benefits of spaced repetition.'}]
+        params = {'model': 'gpt-4', 'max_tokens': options['max_tokens']}
+
+        started = time.monotonic()
+        if options['use_async']:
+            latencies, failures = asyncio.run(self.run_async(client, messages, params, options))
+        else:
+            latencies, failures = self.run_sync(client, messages, params, options)
+        elapsed = time.monotonic() - started
+
+        latencies_ms = np.asarray(latencies or [0.0]) * 1000
+        self.stdout.write(
+            f"{len(latencies)} ok, {failures} failed in {elapsed:.2f}s "
+            f"({len(latencies) / elapsed:.1f} req/s)  p50={np.percentile(latencies_ms, 50):.1f}ms  "
+            f"p95={np.percentile(latencies_ms, 95):.1f}ms"
+        )
+        self.stdout.write(f"client stats: {client.stats}")
+
+    def run_sync(self, client, messages, params, options):
+        def call(_):
+            started = time.monotonic()
+            try:
+                client.chat(messages, **params)
+            except OpenAIError:
+                return None
+            return time.monotonic() - started
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            results = list(executor.map(call, range(options['requests'])))
+        latencies = [result for result in results if result is not None]
+        return latencies, len(results) - len(latencies)
+
+    async def run_async(self, client, messages, params, options):
+        callers = asyncio.Semaphore(options['concurrency'])
+
+        async def call():
+            async with callers:
+                started = time.monotonic()
+                try:
+                    await client.achat(messages, **params)
+                except OpenAIError:
+                    return None
+                return time.monotonic() - started
+
+        results = await asyncio.gather(*(call() for _ in range(options['requests'])))
+        latencies = [result for result in results if result is not None]
+        return latencies, len(results) - len(latencies)
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+from ai.ann import course_ann_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the course ANN index from CourseEmbedding rows and persist it to disk.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--n-lists', type=int, default=None,
+                            help='Number of IVF clusters (defaults to sqrt of the catalog size).')
+        parser.add_argument('--iterations', type=int, default=10)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        index = course_ann_index.build(n_lists=options['n_lists'], iterations=options['iterations'])
+        if index is None:
+            self.stdout.write(self.style.WARNING('No course embeddings found; nothing to index.'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {len(index)} courses into {len(index.centroids)} lists "
+            f"in {time.monotonic() - started:.2f}s -> {course_ann_index.path}"
+        ))
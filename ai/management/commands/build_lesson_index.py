@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from courses.models import Course
+from ai.retrieval import lesson_retriever
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-course lesson retrieval indexes and persist them to disk.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', dest='courses',
+                            help='Only rebuild this course (repeatable).')
+
+    def handle(self, *args, **options):
+        course_ids = options['courses'] or Course.objects.values_list('id', flat=True)
+        started = time.monotonic()
+        courses = chunks = 0
+        for course_id in course_ids:
+            chunks += len(lesson_retriever.build(course_id))
+            courses += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {chunks} lesson chunks across {courses} courses "
+            f"in {time.monotonic() - started:.2f}s -> {lesson_retriever.directory}"
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from courses.models import Course
+from ai.embeddings import HashingEmbeddingProvider, get_embedding_provider
+from ai.services import CourseRecommendationService
+
+
+class Command(BaseCommand):
+    help = 'Fit bucket IDF weights for the local hashing embedding provider from the course catalog.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Output .npy file; point AI_EMBEDDING_OPTIONS['idf_path'] at it.")
+
+    def handle(self, *args, **options):
+        provider = get_embedding_provider()
+        if not isinstance(provider, HashingEmbeddingProvider):
+            raise CommandError('AI_EMBEDDING_PROVIDER is not the local hashing provider.')
+
+        courses = Course.objects.only('title', 'description', 'category', 'level').iterator()
+        texts = [CourseRecommendationService.course_embedding_text(course) for course in courses]
+        provider.fit_idf(texts, path=options['path'])
+        self.stdout.write(self.style.SUCCESS(f"Fitted IDF on {len(texts)} courses -> {options['path']}"))
@@ -0,0 +1,50 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from ai import grading_queue
+from ai.services import AssessmentService
+
+
+class Command(BaseCommand):
+    help = 'Claim queued grading jobs and grade their free-text answers in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=getattr(settings, 'AI_GRADING_JOBS_PER_CLAIM', 10),
+                            help='Jobs claimed and graded together per round.')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty.')
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        service = AssessmentService()
+        processed = 0
+
+        while not self.stopping:
+            close_old_connections()
+            requeued = grading_queue.requeue_stale()
+            if requeued:
+                self.stdout.write(f"Requeued {requeued} stale jobs")
+
+            jobs = grading_queue.claim(options['jobs'])
+            if not jobs:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            started = time.monotonic()
+            grading_queue.process(jobs, service=service)
+            processed += len(jobs)
+            self.stdout.write(f"Processed {len(jobs)} jobs in {time.monotonic() - started:.1f}s")
+
+        self.stdout.write(self.style.SUCCESS(f"Stopped after {processed} jobs."))
+
+    def stop(self, signum, frame):
+        """Finish the current round, then exit."""
+        self.stopping = True
@@ -0,0 +1,61 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def _init_worker():
+    # Needed under the "spawn" start method; a no-op for forked workers. Spawned
+    # workers import this module before setup, so it must not touch models at import.
+    django.setup()
+
+
+def _materialize_chunk(user_ids, limit, generate_reasons):
+    from ai.services import CourseRecommendationService
+
+    users = get_user_model().objects.filter(pk__in=user_ids).only('id', 'interests', 'learning_progress')
+    return CourseRecommendationService().materialize_recommendations(
+        users, limit=limit, generate_reasons=generate_reasons
+    )
+
+
+class Command(BaseCommand):
+    help = 'Precompute recommendations for all active users into CourseRecommendation.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=200)
+        parser.add_argument('--processes', type=int, default=None,
+                            help='Worker processes (defaults to the CPU count).')
+        parser.add_argument('--limit', type=int, default=5, help='Recommendations per user.')
+        parser.add_argument('--with-reasons', action='store_true',
+                            help='Generate model-written reasons instead of templated ones.')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        user_ids = list(
+            get_user_model().objects.filter(is_active=True).order_by('pk').values_list('pk', flat=True)
+        )
+        chunks = [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+        self.stdout.write(f"Materializing recommendations for {len(user_ids)} users in {len(chunks)} chunks")
+
+        # Worker processes must open their own database connections
+        connections.close_all()
+
+        started = time.monotonic()
+        done = 0
+        with ProcessPoolExecutor(max_workers=options['processes'], initializer=_init_worker) as pool:
+            futures = [
+                pool.submit(_materialize_chunk, chunk, options['limit'], options['with_reasons'])
+                for chunk in chunks
+            ]
+            for future in as_completed(futures):
+                done += future.result()
+                elapsed = max(time.monotonic() - started, 1e-6)
+                self.stdout.write(f"{done}/{len(user_ids)} users ({done / elapsed:.1f} users/s)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Materialized recommendations for {done} users in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,175 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+class RateLimit:
+    """Server-side requests-per-minute bucket mimicking the API's 429s."""
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, per_minute / 60.0)  # Allow about one second of burst
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """Return 0 if the request is allowed, else seconds until it would be."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real API
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        server.count('requests')
+
+        if server.rate_limit:
+            wait = server.rate_limit.take()
+            if wait:
+                server.count('rate_limited')
+                return self.send_json(
+                    429, {'error': {'message': 'Rate limit reached', 'type': 'requests'}},
+                    {'Retry-After': f"{wait:.3f}"},
+                )
+        if random.random() < server.error_rate:
+            server.count('errors')
+            return self.send_json(503, {'error': {'message': 'The server is overloaded'}})
+
+        time.sleep(server.latency)
+        path = self.path.rstrip('/')
+        if path.endswith('/chat/completions'):
+            return self.chat(payload)
+        if path.endswith('/embeddings'):
+            return self.embeddings(payload)
+        if path.endswith('/audio/speech'):
+            return self.speech(payload)
+        self.send_json(404, {'error': {'message': f"Unknown path {self.path}"}})
+
+    def chat(self, payload):
+        prompt = payload['messages'][-1]['content']
+        reply = f"Stub reply to: {prompt[:80]}"
+        if (payload.get('response_format') or {}).get('type') == 'json_object':
+            reply = json.dumps(self.json_reply(prompt))
+        if not payload.get('stream'):
+            return self.send_json(200, {
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': reply}}],
+                'usage': {'total_tokens': len(prompt.split()) + len(reply.split())},
+            })
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        words = reply.split(' ')
+        events = [{'choices': [{'delta': {'role': 'assistant'}}]}] + [
+            {'choices': [{'delta': {'content': word if i == 0 else f" {word}"}}]} for i, word in enumerate(words)
+        ]
+        for event in events:
+            self.write_chunk(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+        self.write_chunk(b"data: [DONE]\n\n")
+        self.write_chunk(b"")
+
+    @staticmethod
+    def json_reply(prompt):
+        """Full marks for every item of a batch grading prompt; ``{}`` otherwise."""
+        start = prompt.rfind('[{')
+        try:
+            items = json.loads(prompt[start:prompt.rindex('}]') + 2]) if start != -1 else []
+        except ValueError:
+            return {}
+        return {'grades': [
+            {'id': item.get('id'), 'points': item.get('max_points', 0), 'feedback': 'Stub feedback'}
+            for item in items if isinstance(item, dict)
+        ]}
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def embeddings(self, payload):
+        texts = payload['input'] if isinstance(payload['input'], list) else [payload['input']]
+        dim = self.server.dim
+        data = []
+        for index, text in enumerate(texts):
+            rng = random.Random(text)
+            data.append({'index': index, 'embedding': [rng.uniform(-1, 1) for _ in range(dim)]})
+        self.send_json(200, {'data': data, 'usage': {'total_tokens': sum(len(t.split()) for t in texts)}})
+
+    def speech(self, payload):
+        audio = payload['input'].encode('utf-8')  # Not real audio; size scales with the text
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/mpeg')
+        self.send_header('Content-Length', str(len(audio)))
+        self.end_headers()
+        self.wfile.write(audio)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency, error_rate, requests_per_minute, dim):
+        super().__init__(address, StubHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = RateLimit(requests_per_minute) if requests_per_minute else None
+        self.dim = dim
+        self.stats = {'requests': 0, 'rate_limited': 0, 'errors': 0}
+        self._stats_lock = threading.Lock()
+
+    def count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+
+class Command(BaseCommand):
+    help = 'Run a local stand-in for the OpenAI API (set OPENAI_BASE_URL to http://HOST:PORT/v1).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8089)
+        parser.add_argument('--latency', type=float, default=0.05, help='Seconds added to every response.')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with 503.')
+        parser.add_argument('--requests-per-minute', type=int, default=0,
+                            help='Answer requests over this rate with 429 and Retry-After; 0 disables.')
+        parser.add_argument('--dim', type=int, default=1536, help='Embedding dimension.')
+
+    def handle(self, *args, **options):
+        server = StubServer(
+            (options['host'], options['port']), options['latency'], options['error_rate'],
+            options['requests_per_minute'], options['dim'],
+        )
+        self.stdout.write(f"Stub OpenAI API listening on http://{options['host']}:{options['port']}/v1")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"Served {server.stats}")
@@ -0,0 +1,87 @@
+import ai.fields
+from django.db import migrations, models
+
+
+def json_to_binary(apps, schema_editor):
+    for model_name in ('UserEmbedding', 'CourseEmbedding'):
+        model = apps.get_model('ai', model_name)
+        batch = []
+        for embedding in model.objects.only('id', 'embedding_vector').iterator(chunk_size=500):
+            embedding.embedding_blob = embedding.embedding_vector
+            batch.append(embedding)
+            if len(batch) >= 500:
+                model.objects.bulk_update(batch, ['embedding_blob'])
+                batch = []
+        model.objects.bulk_update(batch, ['embedding_blob'])
+
+
+def binary_to_json(apps, schema_editor):
+    for model_name in ('UserEmbedding', 'CourseEmbedding'):
+        model = apps.get_model('ai', model_name)
+        batch = []
+        for embedding in model.objects.only('id', 'embedding_blob').iterator(chunk_size=500):
+            embedding.embedding_vector = embedding.embedding_blob.tolist()
+            batch.append(embedding)
+            if len(batch) >= 500:
+                model.objects.bulk_update(batch, ['embedding_vector'])
+                batch = []
+        model.objects.bulk_update(batch, ['embedding_vector'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='courseembedding',
+            name='embedding_blob',
+            field=ai.fields.VectorField(null=True),
+        ),
+        migrations.AddField(
+            model_name='userembedding',
+            name='embedding_blob',
+            field=ai.fields.VectorField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='courseembedding',
+            name='embedding_vector',
+            field=models.JSONField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='userembedding',
+            name='embedding_vector',
+            field=models.JSONField(null=True),
+        ),
+        migrations.RunPython(json_to_binary, binary_to_json),
+        migrations.RemoveField(
+            model_name='courseembedding',
+            name='embedding_vector',
+        ),
+        migrations.RemoveField(
+            model_name='userembedding',
+            name='embedding_vector',
+        ),
+        migrations.RenameField(
+            model_name='courseembedding',
+            old_name='embedding_blob',
+            new_name='embedding_vector',
+        ),
+        migrations.RenameField(
+            model_name='userembedding',
+            old_name='embedding_blob',
+            new_name='embedding_vector',
+        ),
+        migrations.AlterField(
+            model_name='courseembedding',
+            name='embedding_vector',
+            field=ai.fields.VectorField(),
+        ),
+        migrations.AlterField(
+            model_name='userembedding',
+            name='embedding_vector',
+            field=ai.fields.VectorField(),
+        ),
+    ]
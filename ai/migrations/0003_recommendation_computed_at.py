@@ -0,0 +1,25 @@
+# Generated by Django 5.1.7 on 2026-10-18 01:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0002_binary_embedding_vectors'),
+        ('courses', '__first__'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='courserecommendation',
+            name='computed_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='courserecommendation',
+            index=models.Index(fields=['user', '-score'], name='ai_coursere_user_id_652972_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-18 01:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0003_recommendation_computed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatconversation',
+            name='summarized_until',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chatconversation',
+            name='summary',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['conversation', 'id'], name='ai_chatmess_convers_320ef6_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.7 on 2026-10-18 01:56
+
+import ai.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0004_chat_history_summary'),
+        ('tests', '__first__'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradingCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question_hash', models.CharField(max_length=64)),
+                ('max_points', models.PositiveIntegerField()),
+                ('answer_hash', models.CharField(max_length=64)),
+                ('answer_vector', ai.fields.VectorField(blank=True, null=True)),
+                ('points', models.PositiveIntegerField()),
+                ('feedback', models.TextField()),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_hit_at', models.DateTimeField(blank=True, null=True)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='grading_cache_entries', to='tests.question')),
+            ],
+            options={
+                'unique_together': {('question', 'question_hash', 'max_points', 'answer_hash')},
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.7 on 2026-10-18 01:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0005_grading_cache'),
+        ('tests', '__first__'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradingJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('regrade', models.BooleanField(default=False)),
+                ('tries', models.PositiveSmallIntegerField(default=0)),
+                ('claim_token', models.CharField(blank=True, max_length=32)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('attempt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='grading_jobs', to='tests.testattempt')),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='ai_gradingj_status_ce6920_idx')],
+            },
+        ),
+    ]
@@ -1,11 +1,15 @@
 from django.db import models
 from django.conf import settings
 from courses.models import Course
+from tests.models import Question, TestAttempt
+from .fields import VectorField
 
 class ChatConversation(models.Model):
     """Model for storing chat conversations with the AI assistant."""
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='chat_conversations')
     course = models.ForeignKey(Course, on_delete=models.CASCADE, null=True, blank=True, related_name='chat_conversations')
+    summary = models.TextField(blank=True)  # Rolling summary of turns that left the history window
+    summarized_until = models.BigIntegerField(default=0)  # Id of the last message folded into the summary
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -24,6 +28,7 @@ class ChatMessage(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [models.Index(fields=['conversation', 'id'])]
 
     def __str__(self):
         return f"{self.conversation.user.email} - {self.role} - {self.created_at}"
@@ -36,10 +41,12 @@ class CourseRecommendation(models.Model):
     reason = models.TextField()  # Explanation for the recommendation
     is_viewed = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    computed_at = models.DateTimeField(auto_now=True)  # When the score was last (re)computed
 
     class Meta:
         ordering = ['-score']
         unique_together = ['user', 'course']
+        indexes = [models.Index(fields=['user', '-score'])]
 
     def __str__(self):
         return f"{self.user.email} - {self.course.title}"
@@ -47,7 +54,8 @@ class CourseRecommendation(models.Model):
 class UserEmbedding(models.Model):
     """Model for storing user embeddings for recommendation system."""
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='embedding')
-    embedding_vector = models.JSONField()  # Store the embedding as a JSON array
+    embedding_vector = VectorField()  # Packed float32 embedding, loaded as a NumPy array
+    content_hash = models.CharField(max_length=64, blank=True)  # Hash of the embedded text
     last_updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
@@ -56,8 +64,68 @@ class UserEmbedding(models.Model):
 class CourseEmbedding(models.Model):
     """Model for storing course embeddings for recommendation system."""
     course = models.OneToOneField(Course, on_delete=models.CASCADE, related_name='embedding')
-    embedding_vector = models.JSONField()  # Store the embedding as a JSON array
+    embedding_vector = VectorField()  # Packed float32 embedding, loaded as a NumPy array
+    content_hash = models.CharField(max_length=64, blank=True)  # Hash of the embedded text
     last_updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"{self.course.title} - Embedding" 
\ No newline at end of file
+        return f"{self.course.title} - Embedding" 
+
+class EmbeddingBackfillCheckpoint(models.Model):
+    """Model for tracking progress of the embedding backfill command."""
+    name = models.CharField(max_length=50, unique=True)
+    last_pk = models.BigIntegerField(default=0)  # Highest primary key already processed
+    processed = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} - {self.last_pk}"
+
+class GradingCacheEntry(models.Model):
+    """Model for reusing AI grades of identical answers to the same question."""
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='grading_cache_entries')
+    question_hash = models.CharField(max_length=64)  # Hash of the question text when graded
+    max_points = models.PositiveIntegerField()
+    answer_hash = models.CharField(max_length=64)  # Hash of the normalized answer
+    answer_vector = VectorField(null=True, blank=True)  # Set when near-duplicate matching is enabled
+    points = models.PositiveIntegerField()
+    feedback = models.TextField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_hit_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ['question', 'question_hash', 'max_points', 'answer_hash']
+
+    def __str__(self):
+        return f"{self.question_id} - {self.answer_hash[:12]}"
+
+class GradingJob(models.Model):
+    """Model for queued AI grading of a test attempt's free-text answers."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    attempt = models.ForeignKey(TestAttempt, on_delete=models.CASCADE, related_name='grading_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    regrade = models.BooleanField(default=False)  # Also re-grade answers that already have points
+    tries = models.PositiveSmallIntegerField(default=0)
+    claim_token = models.CharField(max_length=32, blank=True)  # Identifies the claim that owns a running job
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self):
+        return f"{self.attempt_id} - {self.status}"
\ No newline at end of file
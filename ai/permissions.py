@@ -0,0 +1,15 @@
+from django.db.models import Q
+from courses.models import Course, Enrollment
+
+
+def accessible_courses(user):
+    """Courses whose lessons ``user`` may read: enrolled in, teaching, or any for staff."""
+    if user.is_staff:
+        return Course.objects.all()
+    return Course.objects.filter(
+        Q(instructor=user) | Q(pk__in=Enrollment.objects.filter(student=user).values('course_id'))
+    )
+
+
+def can_access_course(user, course_id):
+    return accessible_courses(user).filter(pk=course_id).exists()
@@ -0,0 +1,29 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets content negotiation accept ``text/event-stream`` for SSE actions."""
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or isinstance(data, (str, bytes)):
+            return data
+        # Errors raised before streaming starts are sent as a single JSON event
+        return f"event: error\ndata: {json.dumps(data)}\n\n"
+
+
+class AudioRenderer(BaseRenderer):
+    """Lets content negotiation accept audio for actions that return audio files."""
+    media_type = 'audio/mpeg'
+    format = 'mp3'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or isinstance(data, bytes):
+            return data
+        return json.dumps(data).encode('utf-8')
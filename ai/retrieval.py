@@ -0,0 +1,231 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from courses.models import Lesson
+
+from .tokens import estimate_tokens
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, last writer wins
+    fcntl = None
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by do does for from how i in is it of on or "
+    "so that the this to was what when where which who why with you".split()
+)
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def chunk_text(text, chunk_words=150, overlap=30):
+    """Split ``text`` into windows of at most ``chunk_words`` words that overlap."""
+    words = text.split()
+    if len(words) <= chunk_words:
+        return [' '.join(words)] if words else []
+    step = max(1, chunk_words - overlap)
+    return [
+        ' '.join(words[start:start + chunk_words])
+        for start in range(0, len(words) - overlap, step)
+    ]
+
+
+class BM25Index:
+    """Okapi BM25 over the lesson chunks of one course.
+
+    Lessons are added and removed individually, so a lesson edit only
+    re-chunks that lesson.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.chunks = {}  # chunk id -> (lesson_id, lesson title, text, length, term counts)
+        self.postings = defaultdict(dict)  # term -> {chunk id: term count}
+        self.lesson_chunks = defaultdict(list)
+        self.total_length = 0
+        self._next_id = 0
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def _add_chunk(self, lesson_id, title, text, counts):
+        chunk_id = self._next_id
+        self._next_id += 1
+        length = sum(counts.values())
+        self.chunks[chunk_id] = (lesson_id, title, text, length, counts)
+        for term, count in counts.items():
+            self.postings[term][chunk_id] = count
+        self.lesson_chunks[lesson_id].append(chunk_id)
+        self.total_length += length
+
+    def add_lesson(self, lesson_id, title, content, chunk_words=150):
+        """Index a lesson, replacing any chunks it already had."""
+        self.remove_lesson(lesson_id)
+        for text in chunk_text(content, chunk_words, overlap=chunk_words // 5):
+            self._add_chunk(lesson_id, title, text, Counter(tokenize(f"{title} {text}")))
+
+    def remove_lesson(self, lesson_id):
+        for chunk_id in self.lesson_chunks.pop(lesson_id, ()):
+            _, _, _, length, counts = self.chunks.pop(chunk_id)
+            for term in counts:
+                postings = self.postings[term]
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self.postings[term]
+            self.total_length -= length
+
+    def search(self, query, k=3):
+        """Return up to ``k`` ``(score, lesson_id, title, text)`` tuples, best first."""
+        n = len(self.chunks)
+        if not n:
+            return []
+        average_length = self.total_length / n
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, count in postings.items():
+                length = self.chunks[chunk_id][3]
+                norm = self.k1 * (1 - self.b + self.b * length / average_length)
+                scores[chunk_id] += idf * count * (self.k1 + 1) / (count + norm)
+
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(score, *self.chunks[chunk_id][:3]) for chunk_id, score in best]
+
+    def to_dict(self):
+        return {
+            'k1': self.k1,
+            'b': self.b,
+            'chunks': [
+                [lesson_id, title, text, counts]
+                for lesson_id, title, text, _, counts in self.chunks.values()
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        index = cls(k1=data['k1'], b=data['b'])
+        for lesson_id, title, text, counts in data['chunks']:
+            index._add_chunk(lesson_id, title, text, Counter(counts))
+        return index
+
+
+class LessonRetriever:
+    """Per-course BM25 indexes over lesson content, persisted as JSON files.
+
+    Each course's index lives in ``AI_RETRIEVAL_INDEX_DIR``; it is built from
+    the database on first use, patched by ``Lesson`` signals and reloaded
+    when another process writes a newer file.
+    """
+
+    def __init__(self, directory=None, chunk_words=None):
+        self.directory = directory or getattr(
+            settings, 'AI_RETRIEVAL_INDEX_DIR',
+            os.path.join(settings.BASE_DIR, 'indexes', 'lessons'),
+        )
+        self.chunk_words = chunk_words or getattr(settings, 'AI_RETRIEVAL_CHUNK_WORDS', 150)
+        self._indexes = {}  # course_id -> (index, mtime)
+        self._lock = threading.RLock()
+
+    def path(self, course_id):
+        return os.path.join(self.directory, f"course_{course_id}.json")
+
+    def _file_mtime(self, course_id):
+        try:
+            return os.stat(self.path(course_id)).st_mtime
+        except OSError:
+            return None
+
+    @contextmanager
+    def _file_lock(self, course_id):
+        """Serialize read-modify-write cycles on a course's file across processes."""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(f"{self.path(course_id)}.lock", 'w') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _save(self, course_id, index):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(course_id)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index.to_dict(), f)
+        os.replace(tmp_path, path)
+        return self._file_mtime(course_id)
+
+    def build(self, course_id, save=True):
+        """Rebuild a course's index from its lessons."""
+        index = BM25Index()
+        for lesson_id, title, content in Lesson.objects.filter(course_id=course_id).values_list(
+            'id', 'title', 'content'
+        ).iterator():
+            index.add_lesson(lesson_id, title, content, self.chunk_words)
+        mtime = self._save(course_id, index) if save else None
+        with self._lock:
+            self._indexes[course_id] = (index, mtime)
+        return index
+
+    def get(self, course_id):
+        """Return the course's index, loading or building it when needed."""
+        mtime = self._file_mtime(course_id)
+        with self._lock:
+            cached = self._indexes.get(course_id)
+            if cached is not None and (mtime is None or cached[1] == mtime):
+                return cached[0]
+            if mtime is None:
+                return self.build(course_id)
+            with open(self.path(course_id), encoding='utf-8') as f:
+                index = BM25Index.from_dict(json.load(f))
+            self._indexes[course_id] = (index, mtime)
+            return index
+
+    def update_lesson(self, lesson):
+        """Re-chunk one lesson and persist its course's index."""
+        with self._lock, self._file_lock(lesson.course_id):
+            index = self.get(lesson.course_id)
+            index.add_lesson(lesson.pk, lesson.title, lesson.content, self.chunk_words)
+            self._indexes[lesson.course_id] = (index, self._save(lesson.course_id, index))
+
+    def remove_lesson(self, course_id, lesson_id):
+        with self._lock, self._file_lock(course_id):
+            index = self.get(course_id)
+            index.remove_lesson(lesson_id)
+            self._indexes[course_id] = (index, self._save(course_id, index))
+
+    def search(self, course_id, query, k=3):
+        with self._lock:
+            return self.get(course_id).search(query, k)
+
+    def context(self, course_id, query, k=None, max_tokens=None):
+        """Top lesson excerpts for ``query`` formatted for the prompt, within ``max_tokens``."""
+        k = k or getattr(settings, 'AI_RETRIEVAL_TOP_K', 3)
+        max_tokens = max_tokens or getattr(settings, 'AI_RETRIEVAL_CONTEXT_TOKENS', 800)
+        excerpts, used = [], 0
+        for _, _, title, text in self.search(course_id, query, k):
+            excerpt = f"[{title}]\n{text}"
+            cost = estimate_tokens(excerpt)
+            if used + cost > max_tokens:
+                break
+            excerpts.append(excerpt)
+            used += cost
+        return "\n\n".join(excerpts)
+
+
+lesson_retriever = LessonRetriever()
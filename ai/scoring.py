@@ -0,0 +1,130 @@
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .embeddings import get_embedding_provider
+from .models import CourseEmbedding
+
+
+class CourseEmbeddingMatrix:
+    """In-memory matrix of published course embeddings for top-k scoring.
+
+    Rows are L2-normalized float32 vectors, so scoring a user is a single
+    matrix-vector product. The matrix is built lazily, patched by signals when
+    a ``CourseEmbedding`` or ``Course`` changes, and rebuilt after ``ttl``
+    seconds so changes made by other worker processes are eventually picked up.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'AI_SCORING_MATRIX_TTL', 300)
+        self._lock = threading.RLock()
+        self._course_ids = np.empty(0, dtype=np.int64)
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._rows = {}
+        self._built_at = None
+
+    @staticmethod
+    def normalize(vector):
+        """Return ``vector`` as a unit-length float32 array."""
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def rebuild(self):
+        """Load every published course embedding into a fresh matrix."""
+        rows = CourseEmbedding.objects.filter(
+            course__is_published=True
+        ).values_list('course_id', 'embedding_vector')
+
+        dim = get_embedding_provider().dim
+        course_ids, vectors = [], []
+        for course_id, vector in rows.iterator():
+            if dim and len(vector) != dim:
+                continue  # Embedded by a previously configured provider
+            course_ids.append(course_id)
+            vectors.append(vector)
+
+        if vectors:
+            matrix = np.vstack(vectors).astype(np.float32, copy=False)
+        else:
+            # No embeddings yet: keep the provider's width so upserts and scoring still line up
+            matrix = np.empty((0, dim or 0), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        matrix /= norms
+
+        with self._lock:
+            self._course_ids = np.asarray(course_ids, dtype=np.int64)
+            self._matrix = matrix
+            self._rows = {course_id: row for row, course_id in enumerate(course_ids)}
+            self._built_at = time.monotonic()
+
+    def invalidate(self):
+        """Force a full rebuild on the next query."""
+        with self._lock:
+            self._built_at = None
+
+    def upsert(self, course_id, vector):
+        """Insert or replace the row for ``course_id``."""
+        vector = self.normalize(vector)
+        with self._lock:
+            if self._built_at is None:
+                return  # Picked up by the next rebuild
+            if self._matrix.size and vector.shape[0] != self._matrix.shape[1]:
+                self._built_at = None
+                return
+
+            row = self._rows.get(course_id)
+            if row is not None:
+                self._matrix[row] = vector
+                return
+
+            self._rows[course_id] = len(self._course_ids)
+            self._course_ids = np.append(self._course_ids, np.int64(course_id))
+            self._matrix = np.vstack([self._matrix.reshape(-1, vector.shape[0]), vector])
+
+    def remove(self, course_id):
+        """Drop the row for ``course_id`` if present."""
+        with self._lock:
+            row = self._rows.pop(course_id, None)
+            if row is None:
+                return
+            self._course_ids = np.delete(self._course_ids, row)
+            self._matrix = np.delete(self._matrix, row, axis=0)
+            self._rows = {int(cid): index for index, cid in enumerate(self._course_ids)}
+
+    def snapshot(self):
+        """Return a consistent ``(course_ids, matrix)`` pair, rebuilding if stale."""
+        with self._lock:
+            stale = self._built_at is None or time.monotonic() - self._built_at > self.ttl
+        if stale:
+            self.rebuild()
+        with self._lock:
+            return self._course_ids, self._matrix
+
+    def top_k(self, user_vector, k, course_ids=None):
+        """Return up to ``k`` ``(course_id, score)`` pairs, best first.
+
+        ``course_ids`` optionally restricts scoring to the given courses.
+        """
+        all_ids, matrix = self.snapshot()
+        user_vector = self.normalize(user_vector)
+        if not len(all_ids) or k <= 0 or user_vector.shape[0] != matrix.shape[1]:
+            return []
+
+        rows = np.arange(len(all_ids))
+        if course_ids is not None:
+            rows = np.flatnonzero(np.isin(all_ids, np.fromiter(course_ids, dtype=np.int64)))
+            if not len(rows):
+                return []
+
+        scores = matrix[rows] @ user_vector if course_ids is not None else matrix @ user_vector
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(all_ids[rows[i]]), float(scores[i])) for i in top]
+
+
+course_embedding_matrix = CourseEmbeddingMatrix()
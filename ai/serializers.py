@@ -0,0 +1,82 @@
+from rest_framework import serializers
+from courses.models import Course, Lesson
+from tests.models import Answer
+from .models import ChatConversation, ChatMessage, GradingJob
+from .permissions import can_access_course
+
+
+class CourseSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Course
+        fields = ('id', 'title', 'description', 'thumbnail', 'category', 'level', 'price')
+
+
+class RecommendationSerializer(serializers.Serializer):
+    course = CourseSummarySerializer(read_only=True)
+    score = serializers.FloatField(read_only=True)
+    reason = serializers.CharField(read_only=True)
+
+
+class ChatMessageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ChatMessage
+        fields = ('id', 'role', 'content', 'created_at')
+        read_only_fields = fields
+
+
+class ChatConversationSerializer(serializers.ModelSerializer):
+    messages = ChatMessageSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = ChatConversation
+        fields = ('id', 'course', 'messages', 'created_at', 'updated_at')
+        read_only_fields = ('created_at', 'updated_at')
+
+    def validate_course(self, course):
+        request = self.context.get('request')
+        if course is not None and not (request and can_access_course(request.user, course.pk)):
+            raise serializers.ValidationError('You do not have access to this course.')
+        return course
+
+
+class ChatMessageCreateSerializer(serializers.Serializer):
+    message = serializers.CharField()
+
+
+class SpeechRequestSerializer(serializers.Serializer):
+    text = serializers.CharField(max_length=4096)
+    voice = serializers.ChoiceField(choices=['alloy', 'echo', 'fable', 'onyx', 'nova', 'shimmer'], default='alloy')
+    model = serializers.ChoiceField(choices=['tts-1', 'tts-1-hd'], default='tts-1')
+
+
+class SpeechStreamSerializer(serializers.Serializer):
+    """Long-form speech: either free text or a lesson's content; the view checks course access."""
+    text = serializers.CharField(required=False, max_length=100000)
+    lesson = serializers.PrimaryKeyRelatedField(queryset=Lesson.objects.all(), required=False)
+    voice = serializers.ChoiceField(choices=['alloy', 'echo', 'fable', 'onyx', 'nova', 'shimmer'], default='alloy')
+    model = serializers.ChoiceField(choices=['tts-1', 'tts-1-hd'], default='tts-1')
+
+    def validate(self, attrs):
+        if ('text' in attrs) == ('lesson' in attrs):
+            raise serializers.ValidationError('Provide exactly one of text or lesson.')
+        return attrs
+
+
+class GradeAnswerSerializer(serializers.Serializer):
+    """One free-text answer to grade outside an attempt."""
+    question = serializers.IntegerField(min_value=1)
+    answer = serializers.CharField(max_length=10000)
+
+
+class GradedAnswerSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Answer
+        fields = ['id', 'question', 'text_answer', 'points_earned', 'feedback']
+
+
+class GradingJobSerializer(serializers.ModelSerializer):
+    score = serializers.DecimalField(source='attempt.score', max_digits=5, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = GradingJob
+        fields = ['id', 'attempt', 'status', 'error', 'score', 'created_at', 'finished_at']
@@ -1,156 +1,536 @@
-import openai
+import hashlib
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.db import transaction
 from django.db.models import Q
+from django.utils import timezone
 from courses.models import Course
+from tests.models import Answer
+from .ann import course_ann_index
+from .answer_cache import course_answer_cache
+from .cache import TTLCache
+from .chat_history import ConversationHistory
+from .client import get_openai_client
+from .embeddings import get_embedding_provider
+from .grading_cache import grading_cache
 from .models import ChatConversation, ChatMessage, CourseRecommendation, UserEmbedding, CourseEmbedding
+from .permissions import can_access_course
+from .retrieval import lesson_retriever
+from .scoring import course_embedding_matrix
+from .tts_cache import tts_cache
+
+# Similarity scores are bucketed so near-identical scores share a cached reason
+REASON_SCORE_BUCKETS = 20
+
+# Shared across requests so a slow reason call never blocks the response it
+# missed; late results still land in the cache for the next request.
+_reason_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'AI_REASON_MAX_WORKERS', 5),
+    thread_name_prefix='recommendation-reason',
+)
+_reason_cache = TTLCache(
+    maxsize=getattr(settings, 'AI_REASON_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'AI_REASON_CACHE_TTL', 24 * 60 * 60),
+)
+_reason_inflight = {}
+_reason_inflight_lock = threading.Lock()
+
+# Sentence chunks of long TTS inputs are synthesized here, a few per stream
+_tts_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'AI_TTS_MAX_WORKERS', 8),
+    thread_name_prefix='tts-chunk',
+)
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
 
 class AIChatbotService:
     """Service for handling AI chatbot interactions."""
     
     def __init__(self):
-        openai.api_key = settings.OPENAI_API_KEY
+        self.client = get_openai_client()
+
+    @staticmethod
+    def has_course_access(conversation):
+        """Whether the conversation's user may see its course's lesson content."""
+        return conversation.course_id is not None and can_access_course(conversation.user, conversation.course_id)
+
+    def build_messages(self, conversation, user_message):
+        """Prepare the model input: course excerpts, summary, recent history and the new message."""
+        messages = ConversationHistory().build(conversation, user_message)
+        if getattr(settings, 'AI_RETRIEVAL_ENABLED', True) and self.has_course_access(conversation):
+            context = lesson_retriever.context(conversation.course_id, user_message)
+            if context:
+                messages.insert(0, {
+                    "role": "system",
+                    "content": f"Relevant excerpts from the course lessons:\n\n{context}",
+                })
+        return messages
+
+    def save_exchange(self, conversation, user_message, ai_response):
+        """Store the user message and the assistant reply."""
+        ChatMessage.objects.bulk_create([
+            ChatMessage(conversation=conversation, role="user", content=user_message),
+            ChatMessage(conversation=conversation, role="assistant", content=ai_response),
+        ])
+        ChatConversation.objects.filter(pk=conversation.pk).update(updated_at=timezone.now())
+
+    async def asave_exchange(self, conversation, user_message, ai_response):
+        await ChatMessage.objects.abulk_create([
+            ChatMessage(conversation=conversation, role="user", content=user_message),
+            ChatMessage(conversation=conversation, role="assistant", content=ai_response),
+        ])
+        await ChatConversation.objects.filter(pk=conversation.pk).aupdate(updated_at=timezone.now())
+
+    def uses_answer_cache(self, conversation):
+        """First turns of course conversations can share cached answers.
+
+        Those answers draw on lesson excerpts, so only users with access to
+        the course share them.
+        """
+        return (
+            getattr(settings, 'AI_CHAT_CACHE_ENABLED', True)
+            and not conversation.messages.exists()
+            and self.has_course_access(conversation)
+        )
 
     def get_chat_response(self, conversation_id, user_message):
         """Get AI response for user message."""
         conversation = ChatConversation.objects.get(id=conversation_id)
-        messages = conversation.messages.all()
-        
-        # Prepare conversation history
-        messages_history = [
-            {"role": msg.role, "content": msg.content}
-            for msg in messages
-        ]
-        
-        # Add current user message
-        messages_history.append({"role": "user", "content": user_message})
-        
+        use_cache = self.uses_answer_cache(conversation)
+        if use_cache:
+            cached = course_answer_cache.get(conversation.course_id, user_message)
+            if cached is not None:
+                self.save_exchange(conversation, user_message, cached)
+                return cached
+
+        messages_history = self.build_messages(conversation, user_message)
+
         try:
             # Get response from OpenAI
-            response = openai.ChatCompletion.create(
+            ai_response = self.client.chat(
+                messages_history,
                 model="gpt-4",
-                messages=messages_history,
                 temperature=0.7,
                 max_tokens=500
             )
             
-            # Extract and store the response
-            ai_response = response.choices[0].message.content
-            ChatMessage.objects.create(
-                conversation=conversation,
-                role="assistant",
-                content=ai_response
-            )
+            # Store the response
+            self.save_exchange(conversation, user_message, ai_response)
+            if use_cache:
+                course_answer_cache.set(conversation.course_id, user_message, ai_response)
             
             return ai_response
             
         except Exception as e:
             return f"Error: {str(e)}"
 
+    def stream_chat_response(self, conversation_id, user_message):
+        """Yield the AI response in pieces as they are generated.
+
+        The assembled reply is stored once the stream finishes, including when
+        the client disconnects part-way through.
+        """
+        conversation = ChatConversation.objects.get(id=conversation_id)
+        use_cache = self.uses_answer_cache(conversation)
+        if use_cache:
+            cached = course_answer_cache.get(conversation.course_id, user_message)
+            if cached is not None:
+                self.save_exchange(conversation, user_message, cached)
+                yield cached
+                return
+
+        messages_history = self.build_messages(conversation, user_message)
+
+        chunks = []
+        completed = False
+        try:
+            for delta in self.client.chat_stream(
+                messages_history,
+                model="gpt-4",
+                temperature=0.7,
+                max_tokens=500
+            ):
+                chunks.append(delta)
+                yield delta
+            completed = True
+        except Exception as e:
+            yield f"Error: {str(e)}"
+        finally:
+            if chunks:
+                self.save_exchange(conversation, user_message, "".join(chunks))
+                if use_cache and completed:
+                    course_answer_cache.set(conversation.course_id, user_message, "".join(chunks))
+
+    async def _acached_answer(self, conversation, user_message):
+        """Return ``(use_cache, cached answer or None)`` without blocking the event loop."""
+        use_cache = await sync_to_async(self.uses_answer_cache)(conversation)
+        if not use_cache:
+            return False, None
+        return True, await sync_to_async(course_answer_cache.get)(conversation.course_id, user_message)
+
+    async def aget_chat_response(self, conversation_id, user_message):
+        """Async variant of :meth:`get_chat_response`."""
+        conversation = await ChatConversation.objects.aget(id=conversation_id)
+        use_cache, cached = await self._acached_answer(conversation, user_message)
+        if cached is not None:
+            await self.asave_exchange(conversation, user_message, cached)
+            return cached
+
+        messages_history = await sync_to_async(self.build_messages)(conversation, user_message)
+
+        try:
+            ai_response = await self.client.achat(
+                messages_history,
+                model="gpt-4",
+                temperature=0.7,
+                max_tokens=500
+            )
+            await self.asave_exchange(conversation, user_message, ai_response)
+            if use_cache:
+                await sync_to_async(course_answer_cache.set)(conversation.course_id, user_message, ai_response)
+            return ai_response
+
+        except Exception as e:
+            return f"Error: {str(e)}"
+
+    async def astream_chat_response(self, conversation_id, user_message):
+        """Async variant of :meth:`stream_chat_response`."""
+        conversation = await ChatConversation.objects.aget(id=conversation_id)
+        use_cache, cached = await self._acached_answer(conversation, user_message)
+        if cached is not None:
+            await self.asave_exchange(conversation, user_message, cached)
+            yield cached
+            return
+
+        messages_history = await sync_to_async(self.build_messages)(conversation, user_message)
+
+        chunks = []
+        completed = False
+        try:
+            async for delta in self.client.achat_stream(
+                messages_history,
+                model="gpt-4",
+                temperature=0.7,
+                max_tokens=500
+            ):
+                chunks.append(delta)
+                yield delta
+            completed = True
+        except Exception as e:
+            yield f"Error: {str(e)}"
+        finally:
+            if chunks:
+                await self.asave_exchange(conversation, user_message, "".join(chunks))
+                if use_cache and completed:
+                    await sync_to_async(course_answer_cache.set)(conversation.course_id, user_message, "".join(chunks))
+
 class CourseRecommendationService:
     """Service for handling course recommendations."""
     
-    def __init__(self):
-        openai.api_key = settings.OPENAI_API_KEY
+    def __init__(self, embedding_provider=None):
+        self.client = get_openai_client()
+        self.embedding_provider = embedding_provider or get_embedding_provider()
 
-    def generate_user_embedding(self, user):
-        """Generate embedding for user interests and learning history."""
-        # Combine user interests and learning history
+    @staticmethod
+    def user_embedding_text(user):
+        """Text used to embed a user's interests and learning history."""
         user_data = f"Interests: {', '.join(user.interests)}\n"
         user_data += f"Learning Progress: {user.learning_progress}"
-        
+        return user_data
+
+    @staticmethod
+    def course_embedding_text(course):
+        """Text used to embed a course."""
+        course_data = f"Title: {course.title}\n"
+        course_data += f"Description: {course.description}\n"
+        course_data += f"Category: {course.category}\n"
+        course_data += f"Level: {course.level}"
+        return course_data
+
+    def content_hash(self, text):
+        """Hash identifying an embedding input for the configured provider."""
+        return hashlib.sha256(f"{self.embedding_provider.name}\n{text}".encode('utf-8')).hexdigest()
+
+    def embed_batch(self, texts):
+        """Embed ``texts`` in a single provider call; returns ``(vectors, total_tokens)``."""
+        return self.embedding_provider.embed(texts)
+
+    def embed_texts(self, texts):
+        """Embed many texts, de-duplicating inputs and batching requests."""
+        unique_texts = list(dict.fromkeys(texts))
+        batch_size = getattr(settings, 'AI_EMBEDDING_BATCH_SIZE', 100)
+        vectors = {}
+        for start in range(0, len(unique_texts), batch_size):
+            batch = unique_texts[start:start + batch_size]
+            batch_vectors, _ = self.embed_batch(batch)
+            vectors.update(zip(batch, batch_vectors))
+        return [vectors[text] for text in texts]
+
+    def generate_user_embedding(self, user):
+        """Generate embedding for user interests and learning history."""
+        user_data = self.user_embedding_text(user)
+        content_hash = self.content_hash(user_data)
+
+        # Reuse the stored embedding while the underlying text is unchanged
+        stored = UserEmbedding.objects.filter(user=user).values_list(
+            'content_hash', 'embedding_vector'
+        ).first()
+        if stored and stored[0] == content_hash:
+            return stored[1]
+
         try:
-            response = openai.Embedding.create(
-                model="text-embedding-ada-002",
-                input=user_data
-            )
-            
+            vector = self.embed_texts([user_data])[0]
+
             # Store the embedding
             UserEmbedding.objects.update_or_create(
                 user=user,
-                defaults={'embedding_vector': response['data'][0]['embedding']}
+                defaults={'embedding_vector': vector, 'content_hash': content_hash}
             )
-            
-            return response['data'][0]['embedding']
-            
+
+            return vector
+
         except Exception as e:
-            return None
+            # Fall back to the previous embedding rather than failing outright
+            return stored[1] if stored else None
 
     def generate_course_embedding(self, course):
         """Generate embedding for course content."""
-        # Combine course information
-        course_data = f"Title: {course.title}\n"
-        course_data += f"Description: {course.description}\n"
-        course_data += f"Category: {course.category}\n"
-        course_data += f"Level: {course.level}"
-        
         try:
-            response = openai.Embedding.create(
-                model="text-embedding-ada-002",
-                input=course_data
-            )
-            
-            # Store the embedding
-            CourseEmbedding.objects.update_or_create(
-                course=course,
-                defaults={'embedding_vector': response['data'][0]['embedding']}
-            )
-            
-            return response['data'][0]['embedding']
-            
+            return self.generate_course_embeddings([course]).get(course.pk)
         except Exception as e:
             return None
 
-    def get_recommendations(self, user, limit=5):
-        """Get course recommendations for a user."""
-        # Get user embedding
-        user_embedding = UserEmbedding.objects.filter(user=user).first()
-        if not user_embedding:
-            user_embedding = self.generate_user_embedding(user)
-            if not user_embedding:
-                return []
-
-        # Get all course embeddings
-        course_embeddings = CourseEmbedding.objects.all()
-        
-        # Calculate similarity scores
-        recommendations = []
-        for course_embedding in course_embeddings:
-            if not course_embedding.course.is_published:
+    def generate_course_embeddings(self, courses):
+        """Embed many courses in batched requests, skipping unchanged ones.
+
+        Returns a dict mapping course id to its embedding vector.
+        """
+        texts = {course.pk: self.course_embedding_text(course) for course in courses}
+        hashes = {course_id: self.content_hash(text) for course_id, text in texts.items()}
+
+        stored = CourseEmbedding.objects.filter(course_id__in=texts).values_list(
+            'course_id', 'content_hash', 'embedding_vector'
+        )
+        vectors = {
+            course_id: vector
+            for course_id, content_hash, vector in stored
+            if hashes[course_id] == content_hash
+        }
+
+        stale = [course_id for course_id in texts if course_id not in vectors]
+        if not stale:
+            return vectors
+
+        embedded = self.embed_texts([texts[course_id] for course_id in stale])
+        CourseEmbedding.objects.bulk_create(
+            [
+                CourseEmbedding(course_id=course_id, embedding_vector=vector, content_hash=hashes[course_id])
+                for course_id, vector in zip(stale, embedded)
+            ],
+            update_conflicts=True,
+            unique_fields=['course'],
+            update_fields=['embedding_vector', 'content_hash', 'last_updated'],
+        )
+        vectors.update(zip(stale, embedded))
+
+        # bulk_create bypasses post_save, so patch the ANN index and refresh the scoring matrix here
+        for course in Course.objects.filter(pk__in=stale).only('is_published', 'level', 'category'):
+            course_ann_index.upsert(course, vectors[course.pk])
+        course_embedding_matrix.invalidate()
+        return vectors
+
+    def get_user_vector(self, user):
+        """Return the user's embedding, re-embedding only if their data changed."""
+        return self.generate_user_embedding(user)
+
+    def get_user_vectors(self, users):
+        """Return ``{user_id: vector}`` for many users, embedding stale ones in batches."""
+        texts = {user.pk: self.user_embedding_text(user) for user in users}
+        hashes = {user_id: self.content_hash(text) for user_id, text in texts.items()}
+
+        vectors, previous = {}, {}
+        stored = UserEmbedding.objects.filter(user_id__in=texts).values_list(
+            'user_id', 'content_hash', 'embedding_vector'
+        )
+        for user_id, content_hash, vector in stored:
+            if hashes[user_id] == content_hash:
+                vectors[user_id] = vector
+            else:
+                previous[user_id] = vector
+
+        stale = [user_id for user_id in texts if user_id not in vectors]
+        if not stale:
+            return vectors
+
+        try:
+            embedded = self.embed_texts([texts[user_id] for user_id in stale])
+        except Exception as e:
+            # Fall back to previous embeddings rather than failing the batch
+            vectors.update(previous)
+            return vectors
+
+        UserEmbedding.objects.bulk_create(
+            [
+                UserEmbedding(user_id=user_id, embedding_vector=vector, content_hash=hashes[user_id])
+                for user_id, vector in zip(stale, embedded)
+            ],
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=['embedding_vector', 'content_hash', 'last_updated'],
+        )
+        vectors.update(zip(stale, embedded))
+        return vectors
+
+    def get_cached_recommendations(self, user, limit=5, max_age=None):
+        """Serve materialized recommendations, computing on demand for cold users.
+
+        Returns ``(recommendations, computed_at)``. Rows older than ``max_age``
+        seconds (``AI_RECOMMENDATION_MAX_AGE`` by default, unlimited if unset)
+        are recomputed, and so are fewer than ``limit`` rows while more
+        courses could be recommended (a larger limit than was materialized).
+        """
+        if max_age is None:
+            max_age = getattr(settings, 'AI_RECOMMENDATION_MAX_AGE', None)
+
+        rows = list(
+            CourseRecommendation.objects.filter(user=user, course__is_published=True)
+            .select_related('course')
+            .order_by('-score')[:limit]
+        )
+        if rows and len(rows) < limit:
+            eligible = CourseEmbedding.objects.filter(course__is_published=True).count()
+            if eligible > len(rows):
+                rows = []
+        if rows:
+            computed_at = min(row.computed_at for row in rows)
+            if max_age is None or timezone.now() - computed_at <= timedelta(seconds=max_age):
+                return [
+                    {'course': row.course, 'score': row.score, 'reason': row.reason}
+                    for row in rows
+                ], computed_at
+
+        return self.get_recommendations(user, limit), timezone.now()
+
+    async def aget_cached_recommendations(self, user, limit=5, max_age=None):
+        """Async wrapper; scoring is database and CPU work, so it runs in a thread."""
+        return await sync_to_async(self.get_cached_recommendations)(user, limit, max_age)
+
+    async def aget_recommendations(self, user, limit=5, level=None, category=None):
+        return await sync_to_async(self.get_recommendations)(user, limit, level=level, category=category)
+
+    def materialize_recommendations(self, users, limit=5, generate_reasons=False):
+        """Compute and store recommendations for many users at once.
+
+        Stale user embeddings are refreshed in batched requests. Reasons are
+        templated unless ``generate_reasons`` is set. Returns the number of
+        users whose recommendations were stored.
+        """
+        users = list(users)
+        vectors = self.get_user_vectors(users)
+        top_scores = {
+            user.pk: self.score_courses(vectors[user.pk], limit)
+            for user in users
+            if user.pk in vectors
+        }
+        courses = Course.objects.in_bulk(
+            {course_id for scores in top_scores.values() for course_id, _ in scores}
+        )
+
+        results = []
+        for user in users:
+            if user.pk not in top_scores:
                 continue
-                
-            # Calculate cosine similarity
-            similarity = self.cosine_similarity(
-                user_embedding.embedding_vector,
-                course_embedding.embedding_vector
-            )
-            
-            # Generate recommendation reason
-            reason = self.generate_recommendation_reason(
-                user, course_embedding.course, similarity
-            )
-            
-            recommendations.append({
-                'course': course_embedding.course,
-                'score': similarity,
-                'reason': reason
-            })
-        
-        # Sort by similarity score and get top recommendations
-        recommendations.sort(key=lambda x: x['score'], reverse=True)
-        top_recommendations = recommendations[:limit]
-        
-        # Store recommendations
-        for rec in top_recommendations:
-            CourseRecommendation.objects.update_or_create(
-                user=user,
-                course=rec['course'],
-                defaults={
-                    'score': rec['score'],
-                    'reason': rec['reason']
+            scored = [
+                (courses[course_id], similarity)
+                for course_id, similarity in top_scores[user.pk]
+                if course_id in courses and courses[course_id].is_published
+            ]
+            if generate_reasons:
+                reasons = self.generate_recommendation_reasons(user, scored)
+            else:
+                reasons = {
+                    course.pk: self.fallback_recommendation_reason(user, course)
+                    for course, _ in scored
                 }
+            results.append((user, [
+                {'course': course, 'score': similarity, 'reason': reasons[course.pk]}
+                for course, similarity in scored
+            ]))
+
+        with transaction.atomic():
+            for user, recommendations in results:
+                self.store_recommendations(user, recommendations)
+        return len(results)
+
+    def get_recommendations(self, user, limit=5, level=None, category=None):
+        """Get course recommendations for a user."""
+        user_vector = self.get_user_vector(user)
+        if user_vector is None:
+            return []
+
+        top_scores = self.score_courses(user_vector, limit, level=level, category=category)
+        courses = Course.objects.in_bulk([course_id for course_id, _ in top_scores])
+
+        scored = [
+            (courses[course_id], similarity)
+            for course_id, similarity in top_scores
+            if course_id in courses and courses[course_id].is_published
+        ]
+
+        # Only the final top-k get a generated reason
+        reasons = self.generate_recommendation_reasons(user, scored)
+        recommendations = [
+            {'course': course, 'score': similarity, 'reason': reasons[course.pk]}
+            for course, similarity in scored
+        ]
+
+        # Filtered results are a view of the catalog, not the user's full set
+        if level is None and category is None:
+            self.store_recommendations(user, recommendations)
+
+        return recommendations
+
+    def store_recommendations(self, user, recommendations):
+        """Upsert a user's recommendations and prune stale ones in one transaction."""
+        with transaction.atomic():
+            CourseRecommendation.objects.bulk_create(
+                [
+                    CourseRecommendation(
+                        user=user, course=rec['course'], score=rec['score'], reason=rec['reason']
+                    )
+                    for rec in recommendations
+                ],
+                update_conflicts=True,
+                unique_fields=['user', 'course'],
+                update_fields=['score', 'reason', 'computed_at'],
             )
-        
-        return top_recommendations
+            CourseRecommendation.objects.filter(user=user).exclude(
+                course_id__in=[rec['course'].pk for rec in recommendations]
+            ).delete()
+
+    def score_courses(self, user_vector, limit, level=None, category=None):
+        """Return the top ``(course_id, score)`` pairs among published courses."""
+        if getattr(settings, 'AI_ANN_ENABLED', True):
+            return course_ann_index.search(
+                user_vector, limit, published=True, level=level, category=category
+            )
+
+        # Exact scoring: one matrix-vector product over every published course
+        course_ids = None
+        if level is not None or category is not None:
+            filters = {'is_published': True}
+            if level is not None:
+                filters['level'] = level
+            if category is not None:
+                filters['category'] = category
+            course_ids = Course.objects.filter(**filters).values_list('id', flat=True)
+        return course_embedding_matrix.top_k(user_vector, limit, course_ids=course_ids)
 
     def cosine_similarity(self, vec1, vec2):
         """Calculate cosine similarity between two vectors."""
@@ -161,36 +541,178 @@ class CourseRecommendationService:
 
     def generate_recommendation_reason(self, user, course, similarity):
         """Generate explanation for course recommendation."""
-        prompt = f"""Based on the user's interests ({', '.join(user.interests)}) 
-        and learning progress, explain why this course ({course.title}) would be 
-        a good fit. Similarity score: {similarity:.2f}"""
-        
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.7,
-                max_tokens=200
-            )
-            return response.choices[0].message.content
+            return self._request_recommendation_reason(user, course, similarity)
         except Exception as e:
             return f"Recommended based on your interests and learning history."
 
+    def generate_recommendation_reasons(self, user, scored):
+        """Generate reasons for ``(course, similarity)`` pairs concurrently.
+
+        Cached reasons are reused; calls that miss the time budget fall back
+        to a templated reason. Returns a dict keyed by course id.
+        """
+        reasons = {}
+        pending = {}
+        for course, similarity in scored:
+            key = self.reason_cache_key(user, course, similarity)
+            cached = _reason_cache.get(key)
+            if cached is not None:
+                reasons[course.pk] = cached
+                continue
+            with _reason_inflight_lock:
+                future = _reason_inflight.get(key)
+                if future is None:
+                    future = _reason_executor.submit(self._cached_reason, key, user, course, similarity)
+                    _reason_inflight[key] = future
+            pending[future] = course
+
+        if pending:
+            done, _ = wait(pending, timeout=getattr(settings, 'AI_REASON_TIME_BUDGET', 3.0))
+            for future, course in pending.items():
+                if future in done:
+                    reasons[course.pk] = future.result()
+                else:
+                    reasons[course.pk] = self.fallback_recommendation_reason(user, course)
+
+        return reasons
+
+    def reason_cache_key(self, user, course, similarity):
+        """Cache key of (user interests hash, course id, score bucket)."""
+        interests = '\x1f'.join(sorted(str(interest) for interest in user.interests))
+        interests_hash = hashlib.sha256(interests.encode('utf-8')).hexdigest()[:16]
+        return (interests_hash, course.pk, int(round(similarity * REASON_SCORE_BUCKETS)))
+
+    def fallback_recommendation_reason(self, user, course):
+        """Cheap templated reason used when the model is slow or unavailable."""
+        interests = ', '.join(str(interest) for interest in user.interests[:3])
+        if interests:
+            return (
+                f"Recommended because this {course.level} {course.category} course "
+                f"matches your interests in {interests}."
+            )
+        return "Recommended based on your interests and learning history."
+
+    def _cached_reason(self, key, user, course, similarity):
+        try:
+            reason = self._request_recommendation_reason(user, course, similarity)
+        except Exception:
+            return self.fallback_recommendation_reason(user, course)
+        else:
+            _reason_cache.set(key, reason)
+            return reason
+        finally:
+            with _reason_inflight_lock:
+                _reason_inflight.pop(key, None)
+
+    def _request_recommendation_reason(self, user, course, similarity):
+        prompt = f"""Based on the user's interests ({', '.join(user.interests)}) 
+        and learning progress, explain why this course ({course.title}) would be 
+        a good fit. Similarity score: {similarity:.2f}"""
+
+        return self.client.chat(
+            [{"role": "user", "content": prompt}],
+            model="gpt-4",
+            temperature=0.7,
+            max_tokens=200
+        )
+
 class VoiceAssistantService:
     """Service for handling text-to-speech conversion."""
     
     def __init__(self):
-        openai.api_key = settings.OPENAI_API_KEY
+        self.client = get_openai_client()
+
+    def get_speech_file(self, text, voice="alloy", model="tts-1"):
+        """Return ``(key, path)`` of the audio for ``text``, synthesizing it on a cache miss."""
+        key = tts_cache.key(text, voice, model)
+        path = tts_cache.get(key)
+        if path is None:
+            path = tts_cache.set(key, self.client.speech(text, model=model, voice=voice))
+        return key, path
+
+    @staticmethod
+    def _read(path):
+        with open(path, 'rb') as f:
+            return f.read()
 
     def text_to_speech(self, text, voice="alloy", model="tts-1"):
-        """Convert text to speech using OpenAI's TTS API."""
+        """Convert text to speech using OpenAI's TTS API; returns MP3 bytes."""
         try:
-            response = openai.audio.speech.create(
-                model=model,
-                voice=voice,
-                input=text
-            )
-            return response
+            _, path = self.get_speech_file(text, voice, model)
+            return self._read(path)
+        except Exception as e:
+            return None
+
+    @staticmethod
+    def split_sentences(text, max_chars=None, first_chars=None):
+        """Pack sentences into chunks of at most ``max_chars`` characters.
+
+        The first chunk is capped at ``first_chars`` so the first audio is
+        ready quickly however long the text is.
+        """
+        max_chars = max_chars or getattr(settings, 'AI_TTS_CHUNK_CHARS', 600)
+        first_chars = first_chars or getattr(settings, 'AI_TTS_FIRST_CHUNK_CHARS', 200)
+        chunks, current = [], ''
+        for sentence in SENTENCE_END_RE.split(' '.join(text.split())):
+            limit = max_chars if chunks else first_chars
+            # Sentences longer than a chunk are split between words
+            while len(sentence) > limit:
+                cut = sentence.rfind(' ', 0, limit)
+                cut = cut if cut > 0 else limit
+                if current:
+                    chunks.append(current)
+                    current = ''
+                chunks.append(sentence[:cut])
+                sentence = sentence[cut:].strip()
+                limit = max_chars
+            if current and len(current) + 1 + len(sentence) > limit:
+                chunks.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}" if current else sentence
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def stream_speech(self, text, voice="alloy", model="tts-1", parallel=None):
+        """Yield MP3 audio for ``text`` chunk by chunk, in order.
+
+        Sentence chunks are synthesized ``parallel`` at a time ahead of the
+        chunk being sent and cached individually. MP3 is a frame stream, so the
+        chunks concatenate into one playable file. A failure on the first
+        chunk raises; a later one ends the stream after the audio sent so far.
+        """
+        parallel = parallel or getattr(settings, 'AI_TTS_PARALLEL_CHUNKS', 3)
+        chunks = self.split_sentences(text)
+        pending = []
+        try:
+            for index in range(len(chunks)):
+                while len(pending) < parallel and index + len(pending) < len(chunks):
+                    chunk = chunks[index + len(pending)]
+                    pending.append(_tts_executor.submit(self.get_speech_file, chunk, voice, model))
+                try:
+                    _, path = pending.pop(0).result()
+                    audio = self._read(path)
+                except Exception:
+                    if index == 0:
+                        raise
+                    return  # The response has started, so an error can no longer be reported
+                yield audio
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def atext_to_speech(self, text, voice="alloy", model="tts-1"):
+        """Async variant of :meth:`text_to_speech`."""
+        key = tts_cache.key(text, voice, model)
+        try:
+            path = tts_cache.get(key)
+            if path is None:
+                audio = await self.client.aspeech(text, model=model, voice=voice)
+                await sync_to_async(tts_cache.set, thread_sensitive=False)(key, audio)
+                return audio
+            return await sync_to_async(self._read, thread_sensitive=False)(path)
         except Exception as e:
             return None
 
@@ -198,44 +720,207 @@ class AssessmentService:
     """Service for handling automated test assessment."""
     
     def __init__(self):
-        openai.api_key = settings.OPENAI_API_KEY
+        self.client = get_openai_client()
 
-    def grade_free_text_answer(self, question, answer, max_points):
-        """Grade free text answers using GPT-4."""
-        prompt = f"""Please grade this answer to the following question:
+    def grading_prompt(self, question, answer, max_points):
+        return f"""Please grade this answer to the following question:
         Question: {question.text}
         Answer: {answer}
         Maximum points: {max_points}
         
         Provide:
-        1. Points earned (0 to {max_points})
+        1. Points earned (0 to {max_points}) on a line of the form "Points: <number>"
         2. Brief feedback
         3. Explanation of the grade
         """
+
+    def parse_grade(self, feedback, max_points):
+        # Extract points (assuming format: "Points: X")
+        points_match = re.search(r"Points:?\s*(\d+)", feedback)
+        if not points_match:
+            # Never store a made-up 0; the answer stays ungraded instead
+            raise ValueError("Grade reply has no points")
+        points = int(points_match.group(1))
         
+        return {
+            'points': min(points, max_points),
+            'feedback': feedback
+        }
+
+    def request_grade(self, question, answer, max_points):
+        feedback = self.client.chat(
+            [{"role": "user", "content": self.grading_prompt(question, answer, max_points)}],
+            model="gpt-4",
+            temperature=0.3,
+            max_tokens=300
+        )
+        return self.parse_grade(feedback, max_points)
+
+    def grade_free_text_answer(self, question, answer, max_points):
+        """Grade free text answers using GPT-4, reusing cached grades."""
         try:
-            response = openai.ChatCompletion.create(
+            use_cache = getattr(settings, 'AI_GRADING_CACHE_ENABLED', True)
+            grade = grading_cache.get(question, answer, max_points) if use_cache else None
+            if grade is None:
+                grade = self.request_grade(question, answer, max_points)
+                if use_cache:
+                    grading_cache.set(question, answer, max_points, grade)
+            return grade
+            
+        except Exception as e:
+            return {
+                'points': 0,
+                'feedback': f"Error grading answer: {str(e)}"
+            }
+
+    async def agrade_free_text_answer(self, question, answer, max_points):
+        """Async variant of :meth:`grade_free_text_answer`."""
+        try:
+            use_cache = getattr(settings, 'AI_GRADING_CACHE_ENABLED', True)
+            if use_cache:
+                grade = await sync_to_async(grading_cache.get)(question, answer, max_points)
+                if grade is not None:
+                    return grade
+            feedback = await self.client.achat(
+                [{"role": "user", "content": self.grading_prompt(question, answer, max_points)}],
                 model="gpt-4",
-                messages=[{"role": "user", "content": prompt}],
                 temperature=0.3,
                 max_tokens=300
             )
-            
-            # Parse the response
-            feedback = response.choices[0].message.content
-            
-            # Extract points (assuming format: "Points: X")
-            import re
-            points_match = re.search(r"Points:?\s*(\d+)", feedback)
-            points = int(points_match.group(1)) if points_match else 0
-            
-            return {
-                'points': min(points, max_points),
-                'feedback': feedback
-            }
-            
+            grade = self.parse_grade(feedback, max_points)
+            if use_cache:
+                await sync_to_async(grading_cache.set)(question, answer, max_points, grade)
+            return grade
+
         except Exception as e:
             return {
                 'points': 0,
                 'feedback': f"Error grading answer: {str(e)}"
-            } 
\ No newline at end of file
+            }
+
+    def batch_grading_prompt(self, answers):
+        items = [
+            {
+                'id': answer.pk,
+                'question': answer.question.text,
+                'answer': answer.text_answer,
+                'max_points': answer.question.points,
+            }
+            for answer in answers
+        ]
+        return f"""Grade each of these free-text answers to test questions.
+        For every item award whole points from 0 to its max_points and give brief feedback.
+        Respond with a JSON object of the form
+        {{"grades": [{{"id": <item id>, "points": <integer>, "feedback": "<text>"}}]}}
+        containing one grade per item.
+
+        Items:
+        {json.dumps(items, ensure_ascii=False)}"""
+
+    def grade_answer_batch(self, answers):
+        """Grade several answers in one structured-output call.
+
+        Returns ``{answer id: {'points', 'feedback'}}``; answers the model
+        skipped are missing from the result.
+        """
+        content = self.client.chat(
+            [{"role": "user", "content": self.batch_grading_prompt(answers)}],
+            model=getattr(settings, 'AI_GRADING_MODEL', 'gpt-4o'),
+            temperature=0.3,
+            max_tokens=150 * len(answers),
+            response_format={"type": "json_object"}
+        )
+        max_points = {answer.pk: answer.question.points for answer in answers}
+        grades = {}
+        for grade in json.loads(content).get('grades', []):
+            try:
+                answer_id, points = int(grade['id']), int(grade['points'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if answer_id in max_points:
+                grades[answer_id] = {
+                    'points': min(max(points, 0), max_points[answer_id]),
+                    'feedback': str(grade.get('feedback', '')),
+                }
+        return grades
+
+    def grade_attempt(self, attempt, regrade=False, **kwargs):
+        """Grade the free-text answers of ``attempt``; only ungraded ones unless ``regrade``."""
+        answers = Answer.objects.filter(attempt=attempt, question__question_type='free_text').select_related('question')
+        if not regrade:
+            answers = answers.filter(points_earned__isnull=True)
+        return self.grade_answers(list(answers.order_by('question__order')), regrade=regrade, **kwargs)
+
+    def grade_answers(self, answers, batch_size=None, max_workers=None, regrade=False):
+        """Grade free-text ``answers`` and store the results.
+
+        Cached grades are reused and answers that are identical after
+        normalization are graded once. The rest are packed ``batch_size`` per
+        request and the requests run concurrently, so grading takes about one
+        model round trip. Answers a batch left out are retried one by one;
+        answers that still fail stay ungraded. Everything is written back with
+        a single ``bulk_update``. With ``regrade`` every answer goes to the
+        model and its fresh grade replaces the cached one.
+        """
+        if not answers:
+            return {'graded': [], 'failed': []}
+        use_cache = getattr(settings, 'AI_GRADING_CACHE_ENABLED', True)
+        items = [(answer.question, answer.text_answer, answer.question.points) for answer in answers]
+        keys = [grading_cache.key(*item) for item in items]
+        cached = grading_cache.get_many(items) if use_cache and not regrade else {}
+
+        # One representative per distinct answer goes to the model
+        representatives = {}
+        for index, key in enumerate(keys):
+            if index not in cached:
+                representatives.setdefault(key, answers[index])
+        to_grade = list(representatives.values())
+        grades = self.grade_uncached(to_grade, batch_size, max_workers) if to_grade else {}
+        if use_cache:
+            fresh = [answer for answer in to_grade if answer.pk in grades]
+            grading_cache.set_many(
+                [(answer.question, answer.text_answer, answer.question.points) for answer in fresh],
+                [grades[answer.pk] for answer in fresh],
+                overwrite=regrade,
+            )
+
+        graded, failed = [], []
+        for index, (answer, key) in enumerate(zip(answers, keys)):
+            grade = cached.get(index) or grades.get(representatives[key].pk if key in representatives else None)
+            if grade is None:
+                failed.append(answer)
+                continue
+            answer.points_earned = Decimal(grade['points'])
+            answer.feedback = grade['feedback']
+            graded.append(answer)
+
+        Answer.objects.bulk_update(graded, ['points_earned', 'feedback'])
+        return {'graded': graded, 'failed': failed}
+
+    def grade_uncached(self, answers, batch_size=None, max_workers=None):
+        """Grade ``answers`` with the model; returns ``{answer id: grade}``."""
+        batch_size = batch_size or getattr(settings, 'AI_GRADING_BATCH_SIZE', 5)
+        max_workers = max_workers or getattr(settings, 'AI_GRADING_MAX_WORKERS', 4)
+
+        batches = [answers[i:i + batch_size] for i in range(0, len(answers), batch_size)]
+        grades = {}
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+            for future in [executor.submit(self.grade_answer_batch, batch) for batch in batches]:
+                try:
+                    grades.update(future.result())
+                except Exception:
+                    pass  # Retried individually below
+
+            missing = [answer for answer in answers if answer.pk not in grades]
+            retries = {
+                answer.pk: executor.submit(
+                    self.request_grade, answer.question, answer.text_answer, answer.question.points
+                )
+                for answer in missing
+            }
+            for answer_id, future in retries.items():
+                try:
+                    grades[answer_id] = future.result()
+                except Exception:
+                    pass
+        return grades
@@ -0,0 +1,93 @@
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from courses.models import Course, Lesson
+from tests.models import Question
+from .ann import course_ann_index
+from .answer_cache import course_answer_cache
+from .grading_cache import grading_cache
+from .models import CourseEmbedding
+from .retrieval import lesson_retriever
+from .scoring import course_embedding_matrix
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=CourseEmbedding)
+def update_course_embedding_matrix(sender, instance, **kwargs):
+    """Patch the scoring matrix and ANN index when a course is re-embedded."""
+    course = Course.objects.filter(pk=instance.course_id).only(
+        'is_published', 'level', 'category'
+    ).first()
+    if course is None:
+        return
+
+    course_ann_index.upsert(course, instance.embedding_vector)
+    if course.is_published:
+        course_embedding_matrix.upsert(instance.course_id, instance.embedding_vector)
+    else:
+        course_embedding_matrix.remove(instance.course_id)
+
+
+@receiver(post_delete, sender=CourseEmbedding)
+def remove_course_embedding_from_matrix(sender, instance, **kwargs):
+    """Drop deleted embeddings from the scoring matrix and ANN index."""
+    course_embedding_matrix.remove(instance.course_id)
+    course_ann_index.remove(instance.course_id)
+
+
+@receiver(post_save, sender=Course)
+def sync_course_publication(sender, instance, **kwargs):
+    """Keep the scoring matrix and ANN filters in sync with course changes."""
+    course_ann_index.update_course(instance)
+    if not instance.is_published:
+        course_embedding_matrix.remove(instance.pk)
+        return
+
+    vector = CourseEmbedding.objects.filter(course=instance).values_list(
+        'embedding_vector', flat=True
+    ).first()
+    if vector is not None:
+        course_embedding_matrix.upsert(instance.pk, vector)
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def invalidate_course_answers(sender, instance, **kwargs):
+    """Cached chatbot answers may be stale once a course's lessons change."""
+    course_answer_cache.invalidate(instance.course_id)
+
+
+def update_index_on_commit(update, *args):
+    """Run an index file update after the transaction commits, logging failures.
+
+    A rolled-back save never reaches the index, and a write error cannot fail
+    the save; ``build_lesson_index`` repairs an index left stale by one.
+    """
+    def run():
+        try:
+            update(*args)
+        except Exception:
+            logger.exception("Updating the lesson retrieval index failed")
+    transaction.on_commit(run)
+
+
+@receiver(post_save, sender=Lesson)
+def index_lesson(sender, instance, **kwargs):
+    """Re-chunk a saved lesson into its course's retrieval index."""
+    update_index_on_commit(lesson_retriever.update_lesson, instance)
+
+
+@receiver(post_delete, sender=Lesson)
+def unindex_lesson(sender, instance, **kwargs):
+    # Ids are read now: the instance's pk is cleared once the delete finishes
+    update_index_on_commit(lesson_retriever.remove_lesson, instance.course_id, instance.pk)
+
+
+@receiver(post_save, sender=Question)
+def invalidate_question_grades(sender, instance, created, **kwargs):
+    """Cached grades no longer apply once a question's text or points change."""
+    if not created:
+        grading_cache.invalidate_question(instance)
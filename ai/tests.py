@@ -0,0 +1,96 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from courses.models import Course, Enrollment, Lesson
+from tests.models import Answer, Question, Test, TestAttempt
+from . import grading_queue
+from .models import GradingJob
+from .services import AssessmentService, VoiceAssistantService
+
+
+class GradingQueueTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.instructor = User.objects.create(username='instructor', email='instructor@example.com')
+        self.student = User.objects.create(username='student', email='student@example.com')
+        self.course = Course.objects.create(
+            title='Python', description='Basics', instructor=self.instructor,
+            category='programming', level='beginner', price=10,
+        )
+        test = Test.objects.create(title='Quiz', description='Quiz', course=self.course)
+        self.attempt = TestAttempt.objects.create(test=test, student=self.student)
+        self.answers = [
+            Answer.objects.create(
+                attempt=self.attempt,
+                question=Question.objects.create(
+                    test=test, question_type='free_text', text=f'Question {i}', points=3, order=i
+                ),
+                text_answer=f'Answer {i}', points_earned=Decimal(1), feedback='old',
+            )
+            for i in range(2)
+        ]
+
+    def test_partially_failed_regrade_is_retried(self):
+        service = AssessmentService()
+        failing = self.answers[1].pk
+
+        def grade_batch(answers):
+            return {answer.pk: {'points': 2, 'feedback': 'new'} for answer in answers if answer.pk != failing}
+
+        job = grading_queue.enqueue(self.attempt, regrade=True)
+        with self.settings(AI_GRADING_CACHE_ENABLED=False), \
+                mock.patch.object(service, 'grade_answer_batch', side_effect=grade_batch), \
+                mock.patch.object(service, 'request_grade', side_effect=RuntimeError('model down')):
+            grading_queue.process(grading_queue.claim(10), service=service, max_tries=3)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, GradingJob.PENDING)
+        self.assertTrue(job.regrade)
+        self.assertEqual(Answer.objects.get(pk=failing).feedback, 'old')
+
+        with self.settings(AI_GRADING_CACHE_ENABLED=False), \
+                mock.patch.object(service, 'grade_answer_batch', side_effect=lambda answers: {
+                    answer.pk: {'points': 2, 'feedback': 'new'} for answer in answers
+                }):
+            grading_queue.process(grading_queue.claim(10), service=service, max_tries=3)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, GradingJob.DONE)
+        for answer in Answer.objects.filter(attempt=self.attempt):
+            self.assertEqual((answer.points_earned, answer.feedback), (Decimal(2), 'new'))
+
+
+class SpeechStreamTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.instructor = User.objects.create(username='instructor', email='instructor@example.com')
+        self.student = User.objects.create(username='student', email='student@example.com')
+        self.outsider = User.objects.create(username='outsider', email='outsider@example.com')
+        course = Course.objects.create(
+            title='Python', description='Basics', instructor=self.instructor,
+            category='programming', level='beginner', price=10, is_published=True,
+        )
+        Enrollment.objects.create(student=self.student, course=course)
+        self.lesson = Lesson.objects.create(
+            course=course, title='Intro', content='Welcome to the course.', order=1, duration=timedelta(minutes=5)
+        )
+        self.client = APIClient()
+
+    def stream(self, user):
+        self.client.force_authenticate(user)
+        with mock.patch.object(VoiceAssistantService, 'stream_speech', return_value=iter([b'audio'])):
+            return self.client.post(reverse('voice-stream'), {'lesson': self.lesson.pk}, format='json')
+
+    def test_lesson_requires_course_access(self):
+        self.assertEqual(self.stream(self.outsider).status_code, 404)
+
+    def test_enrolled_student_and_instructor_can_stream_lesson(self):
+        for user in (self.student, self.instructor):
+            response = self.stream(user)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(b''.join(response.streaming_content), b'audio')
@@ -0,0 +1,23 @@
+import math
+
+# Per-message framing tokens added by the chat format
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encoder = None
+
+
+def estimate_tokens(text):
+    """Estimate the token count of ``text`` locally.
+
+    Uses ``tiktoken`` when it is installed, otherwise ~4 characters per token.
+    """
+    global _encoder
+    if _encoder is None:
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding('cl100k_base')
+        except ImportError:
+            _encoder = False
+    if _encoder:
+        return len(_encoder.encode(text))
+    return math.ceil(len(text) / 4)
@@ -0,0 +1,114 @@
+import hashlib
+import os
+import re
+import threading
+
+from django.conf import settings
+
+KEY_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class TTSCache:
+    """Content-addressed store of synthesized audio under ``MEDIA_ROOT/tts``.
+
+    Files are named by the SHA-256 of model, voice and text, so identical
+    requests share one file and a key's bytes never change. Hits refresh the
+    file's mtime; once the directory grows past ``max_bytes`` the least
+    recently used files are deleted until it is back under ``low_water``.
+    """
+
+    def __init__(self, directory=None, max_bytes=None, low_water=0.9, extension='mp3'):
+        self.directory = directory or getattr(
+            settings, 'AI_TTS_CACHE_DIR', os.path.join(settings.MEDIA_ROOT, 'tts')
+        )
+        self.max_bytes = max_bytes or getattr(settings, 'AI_TTS_CACHE_MAX_BYTES', 500 * 1024 * 1024)
+        self.low_water = low_water
+        self.extension = extension
+        self._size = None  # Bytes on disk, counted lazily and kept approximately in step
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text, voice, model):
+        return hashlib.sha256(f"{model}\n{voice}\n{text}".encode('utf-8')).hexdigest()
+
+    def relative_path(self, key):
+        return os.path.join(key[:2], f"{key}.{self.extension}")
+
+    def path(self, key):
+        if not KEY_RE.match(key):
+            raise ValueError(f"Invalid TTS cache key {key!r}")
+        return os.path.join(self.directory, self.relative_path(key))
+
+    def url(self, key):
+        """Public URL of the cached file, served directly by the web server."""
+        relative = os.path.relpath(self.path(key), settings.MEDIA_ROOT).replace(os.sep, '/')
+        base = settings.MEDIA_URL
+        if not base.startswith(('/', 'http://', 'https://')):
+            base = f"/{base}"
+        return f"{base.rstrip('/')}/{relative}"
+
+    def get(self, key):
+        """Return the cached file's path, or None on a miss."""
+        path = self.path(key)
+        try:
+            os.utime(path)  # Mark as recently used
+        except OSError:
+            return None
+        return path
+
+    def set(self, key, data):
+        """Store ``data`` under ``key`` and return its path."""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan()[1]
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+        return path
+
+    def _scan(self):
+        files, total = [], 0
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(f".{self.extension}"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+                total += stat.st_size
+        return files, total
+
+    def _evict(self):
+        files, total = self._scan()
+        target = self.max_bytes * self.low_water
+        for _, size, path in sorted(files):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        self._size = total
+
+    def clear(self):
+        with self._lock:
+            for _, _, path in self._scan()[0]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._size = 0
+
+
+tts_cache = TTSCache()
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 
 router = DefaultRouter()
 router.register(r'chatbot', views.ChatbotViewSet, basename='chatbot')
@@ -10,4 +10,10 @@ router.register(r'assessment', views.AssessmentViewSet, basename='assessment')
 
 urlpatterns = [
     path('', include(router.urls)),
+    # Async variants; served without blocking a worker under ASGI
+    path('async/chatbot/<int:pk>/message/', async_views.chat_message, name='async-chatbot-message'),
+    path('async/chatbot/<int:pk>/stream/', async_views.chat_stream, name='async-chatbot-stream'),
+    path('async/recommendations/', async_views.recommendations, name='async-recommendations'),
+    path('async/voice/speech/', async_views.text_to_speech, name='async-voice-speech'),
+    path('async/assessment/grade/', async_views.grade_answer, name='async-assessment-grade'),
 ] 
\ No newline at end of file
@@ -1 +1,269 @@
- 
\ No newline at end of file
+import itertools
+import json
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, PermissionDenied
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from tests.models import TestAttempt
+from . import grading_queue
+from .answer_cache import course_answer_cache
+from .grading_cache import grading_cache
+from .models import ChatConversation, GradingJob
+from .permissions import can_access_course
+from .renderers import AudioRenderer, EventStreamRenderer
+from .serializers import (
+    ChatConversationSerializer, ChatMessageCreateSerializer, GradedAnswerSerializer, GradingJobSerializer,
+    RecommendationSerializer, SpeechRequestSerializer, SpeechStreamSerializer,
+)
+from .services import AIChatbotService, AssessmentService, CourseRecommendationService, VoiceAssistantService
+from .tts_cache import tts_cache
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _read_range(f, length, block_size=64 * 1024):
+    try:
+        while length > 0:
+            data = f.read(min(block_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        f.close()
+
+
+def ranged_file_response(request, path, content_type, etag):
+    """Serve ``path`` with ETag revalidation and single-range ``Range`` requests."""
+    response_headers = {
+        'ETag': etag,
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': 'private, max-age=31536000, immutable',  # Content-addressed
+    }
+    if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+        return HttpResponse(status=304, headers=response_headers)
+
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        raise NotFound()
+    size = os.fstat(f.fileno()).st_size
+
+    match = RANGE_RE.match(request.headers.get('Range', '').strip())
+    if_range = request.headers.get('If-Range')
+    if not match or not any(match.groups()) or (if_range and if_range != etag):
+        return FileResponse(f, content_type=content_type, headers=response_headers)
+
+    start, end = match.groups()
+    if start:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    else:
+        start, end = max(size - int(end), 0), size - 1
+    if start >= size or start > end:
+        f.close()
+        return HttpResponse(status=416, headers={**response_headers, 'Content-Range': f"bytes */{size}"})
+
+    f.seek(start)
+    response = StreamingHttpResponse(
+        _read_range(f, end - start + 1), status=206, content_type=content_type, headers=response_headers
+    )
+    response['Content-Range'] = f"bytes {start}-{end}/{size}"
+    response['Content-Length'] = str(end - start + 1)
+    return response
+
+
+class ChatbotViewSet(viewsets.ModelViewSet):
+    serializer_class = ChatConversationSerializer
+    permission_classes = [IsAuthenticated]
+    http_method_names = ['get', 'post', 'delete', 'head', 'options']
+
+    def get_queryset(self):
+        queryset = ChatConversation.objects.filter(user=self.request.user)
+        if self.action == 'retrieve':
+            queryset = queryset.prefetch_related('messages')
+        return queryset
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    @action(detail=True, methods=['post'])
+    def message(self, request, pk=None):
+        conversation = self.get_object()
+        serializer = ChatMessageCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        response = AIChatbotService().get_chat_response(
+            conversation.id, serializer.validated_data['message']
+        )
+        return Response({'response': response})
+
+    @action(detail=True, methods=['post'], renderer_classes=[EventStreamRenderer, JSONRenderer])
+    def stream(self, request, pk=None):
+        """Stream the reply as Server-Sent Events: ``data`` events carry text deltas."""
+        conversation = self.get_object()
+        serializer = ChatMessageCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        chunks = AIChatbotService().stream_chat_response(
+            conversation.id, serializer.validated_data['message']
+        )
+
+        def events():
+            for chunk in chunks:
+                yield f"data: {json.dumps({'delta': chunk})}\n\n"
+            yield "event: done\ndata: {}\n\n"
+
+        response = StreamingHttpResponse(events(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+        return response
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        """Hit-rate counters of this worker's course answer cache."""
+        return Response(course_answer_cache.stats())
+
+
+class CourseRecommendationViewSet(viewsets.ViewSet):
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 5)), 1), 50)
+        except ValueError:
+            limit = 5
+        level = request.query_params.get('level')
+        category = request.query_params.get('category')
+
+        service = CourseRecommendationService()
+        if level or category:
+            recommendations = service.get_recommendations(
+                request.user, limit, level=level, category=category
+            )
+            computed_at = None
+        else:
+            # Served from the materialized table; computed on demand for cold users
+            recommendations, computed_at = service.get_cached_recommendations(request.user, limit)
+
+        return Response({
+            'computed_at': computed_at,
+            'results': RecommendationSerializer(recommendations, many=True).data,
+        })
+
+
+class VoiceAssistantViewSet(viewsets.ViewSet):
+    """Text-to-speech: ``create`` synthesizes (or reuses) audio, ``retrieve`` serves it."""
+    permission_classes = [IsAuthenticated]
+    lookup_value_regex = '[0-9a-f]{64}'
+
+    def get_renderers(self):
+        if self.action in ('retrieve', 'stream'):
+            return [AudioRenderer(), JSONRenderer()]
+        return super().get_renderers()
+
+    def create(self, request):
+        serializer = SpeechRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            key, _ = VoiceAssistantService().get_speech_file(**serializer.validated_data)
+        except Exception as e:
+            return Response({'detail': f"Speech synthesis failed: {e}"}, status=502)
+
+        return Response({
+            'id': key,
+            'audio_url': reverse('voice-detail', args=[key], request=request),
+            # Served straight from MEDIA_ROOT by the web server
+            'media_url': request.build_absolute_uri(tts_cache.url(key)),
+        }, status=201)
+
+    def retrieve(self, request, pk=None):
+        path = tts_cache.get(pk)
+        if path is None:
+            raise NotFound()
+        return ranged_file_response(request, path, 'audio/mpeg', f'"{pk}"')
+
+    @action(detail=False, methods=['post'])
+    def stream(self, request):
+        """Stream speech for long text or a lesson, starting after the first sentences."""
+        serializer = SpeechStreamSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        if 'lesson' in data and not can_access_course(request.user, data['lesson'].course_id):
+            raise NotFound()
+        text = data['lesson'].content if 'lesson' in data else data['text']
+
+        audio = VoiceAssistantService().stream_speech(text, voice=data['voice'], model=data['model'])
+        # Synthesize the first chunk before answering, so a failing request still gets a 502
+        try:
+            first = next(audio, b'')
+        except Exception as e:
+            return Response({'detail': f"Speech synthesis failed: {e}"}, status=502)
+        response = StreamingHttpResponse(itertools.chain([first], audio), content_type='audio/mpeg')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class AssessmentViewSet(viewsets.ViewSet):
+    """AI grading of test attempts, for the student who took them or the course instructor."""
+    permission_classes = [IsAuthenticated]
+
+    def get_attempt(self, pk):
+        attempt = TestAttempt.objects.filter(pk=pk).select_related('test__course').first()
+        user = self.request.user
+        if attempt is None or not (
+            attempt.student_id == user.pk or attempt.test.course.instructor_id == user.pk or user.is_staff
+        ):
+            raise NotFound()
+        return attempt
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        """Hit-rate counters of this worker's grading cache."""
+        return Response(grading_cache.stats())
+
+    @action(detail=True, methods=['post'])
+    def grade(self, request, pk=None):
+        """Queue grading of every ungraded free-text answer (all of them with ``regrade``).
+
+        Returns 202 with the job at once; poll ``grading`` for the result.
+        With ``AI_GRADING_QUEUE_ENABLED`` off the answers are graded inline.
+        Only the course instructor and staff may regrade.
+        """
+        attempt = self.get_attempt(pk)
+        regrade = str(request.data.get('regrade', '')).lower() in ('1', 'true')
+        if regrade and not (attempt.test.course.instructor_id == request.user.pk or request.user.is_staff):
+            raise PermissionDenied('Only the course instructor can regrade an attempt.')
+        if getattr(settings, 'AI_GRADING_QUEUE_ENABLED', True):
+            job = grading_queue.enqueue(attempt, regrade=regrade)
+            return Response(GradingJobSerializer(job).data, status=202)
+
+        result = AssessmentService().grade_attempt(attempt, regrade=regrade)
+        if not result['failed']:
+            grading_queue.update_score(attempt)
+        return Response({
+            'graded': GradedAnswerSerializer(result['graded'], many=True).data,
+            'failed': [answer.pk for answer in result['failed']],
+        })
+
+    @action(detail=True, methods=['get'])
+    def grading(self, request, pk=None):
+        """Status of the attempt's latest grading job, with the grades once done."""
+        attempt = self.get_attempt(pk)
+        job = GradingJob.objects.filter(attempt=attempt).select_related('attempt').order_by('-created_at').first()
+        if job is None:
+            raise NotFound('This attempt has not been submitted for grading.')
+        data = GradingJobSerializer(job).data
+        if job.status == GradingJob.DONE:
+            answers = attempt.answers.filter(question__question_type='free_text').order_by('question__order')
+            data['answers'] = GradedAnswerSerializer(answers, many=True).data
+        return Response(data)
@@ -132,6 +132,14 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Course recommendation model, fitted once and shared by the worker processes
+RECOMMENDATION_MODEL_DIR = os.getenv('RECOMMENDATION_MODEL_DIR', os.path.join(BASE_DIR, 'indexes', 'recommendations'))
+RECOMMENDATION_REFIT_RATIO = float(os.getenv('RECOMMENDATION_REFIT_RATIO', 0.2))  # Share of courses patched before a full refit
+RECOMMENDATION_MODEL_PRELOAD = os.getenv('RECOMMENDATION_MODEL_PRELOAD', 'True') == 'True'
+RECOMMENDATION_CF_WEIGHT = float(os.getenv('RECOMMENDATION_CF_WEIGHT', 0.3))  # Item-item score blended into content scores; 0 disables
+RECOMMENDATION_CF_NEIGHBOURS = int(os.getenv('RECOMMENDATION_CF_NEIGHBOURS', 50))
+RECOMMENDATION_CF_REFRESH_DELAY = float(os.getenv('RECOMMENDATION_CF_REFRESH_DELAY', 30))  # Seconds rating changes are batched
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class EducationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'education'
+
+    def ready(self):
+        import education.signals  # noqa
+
+        # Load the persisted recommendation models once per worker process
+        if getattr(settings, 'RECOMMENDATION_MODEL_PRELOAD', True):
+            from education.collaborative import course_neighbour_model
+            from education.recommendation_model import course_tfidf_model
+            course_tfidf_model.load()
+            course_neighbour_model.load()
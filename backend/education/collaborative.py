@@ -0,0 +1,342 @@
+"""Item-item collaborative filtering over ``UserLearningHistory``.
+
+Every history row becomes one weighted entry of a sparse user x course
+interaction matrix. Courses are compared by the cosine similarity of their
+columns and only the top-k neighbours of each course are kept, so the model
+takes O(courses x k) memory however many learners there are. A user is
+scored by summing the neighbour lists of the courses they took, weighted by
+their interaction with each.
+"""
+import os
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.db import connections
+from scipy import sparse
+from .models import Course, UserLearningHistory
+from .recommendation_model import file_lock
+
+
+def interaction_weight(rating, completed):
+    """Weight of one history row: the rating if given, else completion."""
+    if rating:
+        return rating / 5.0
+    return 0.8 if completed else 0.4
+
+
+def interaction_matrix(user_index, course_index, weights, shape):
+    """Sparse user x course matrix from parallel index and weight arrays."""
+    return sparse.csr_matrix(
+        (np.asarray(weights, dtype=np.float32), (np.asarray(user_index), np.asarray(course_index))),
+        shape=shape,
+    )
+
+
+def top_k(scores, k):
+    """Column indices and values of the ``k`` largest positive entries of each row."""
+    k = min(k, scores.shape[1])
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k] if k else np.empty((len(scores), 0), dtype=np.int64)
+    values = np.take_along_axis(scores, idx, axis=1)
+    order = np.argsort(-values, axis=1, kind='stable')
+    idx, values = np.take_along_axis(idx, order, axis=1), np.take_along_axis(values, order, axis=1)
+    idx[values <= 0] = -1
+    values[values <= 0] = 0
+    return idx.astype(np.int32), values.astype(np.float32)
+
+
+def build_neighbours(matrix, k, chunk_size=512):
+    """Top-``k`` cosine neighbours of every column of the user x course ``matrix``.
+
+    Similarities are computed ``chunk_size`` courses at a time, so peak
+    memory is one ``chunk_size`` x courses block rather than the full
+    course x course matrix. Returns ``(norms, neighbour_idx, neighbour_sim)``;
+    missing neighbours have index -1.
+    """
+    matrix = sparse.csc_matrix(matrix, dtype=np.float32)
+    n_courses = matrix.shape[1]
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel()).astype(np.float32)
+    inverse = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    normalized = (matrix @ sparse.diags(inverse)).tocsc()
+    transposed = normalized.T.tocsr()
+
+    neighbour_idx = np.full((n_courses, k), -1, dtype=np.int32)
+    neighbour_sim = np.zeros((n_courses, k), dtype=np.float32)
+    for start in range(0, n_courses, chunk_size):
+        stop = min(start + chunk_size, n_courses)
+        scores = (transposed[start:stop] @ normalized).toarray()
+        scores[np.arange(stop - start), np.arange(start, stop)] = 0  # A course is not its own neighbour
+        idx, values = top_k(scores, k)
+        neighbour_idx[start:stop, :idx.shape[1]] = idx
+        neighbour_sim[start:stop, :values.shape[1]] = values
+    return norms, neighbour_idx, neighbour_sim
+
+
+class NeighbourSnapshot:
+    """One immutable version of the course neighbour lists.
+
+    ``neighbour_idx`` and ``neighbour_sim`` are courses x k arrays whose rows
+    follow ``course_ids``; ``norms`` holds each course's column norm in the
+    interaction matrix, which incremental updates need.
+    """
+
+    def __init__(self, version, course_ids, norms, neighbour_idx, neighbour_sim):
+        self.version = version
+        self.course_ids = np.asarray(course_ids, dtype=np.int64)
+        self.rows = {int(course_id): row for row, course_id in enumerate(self.course_ids)}
+        self.norms = np.asarray(norms, dtype=np.float32)
+        self.neighbour_idx = np.asarray(neighbour_idx, dtype=np.int32)
+        self.neighbour_sim = np.asarray(neighbour_sim, dtype=np.float32)
+
+    @property
+    def k(self):
+        return self.neighbour_idx.shape[1]
+
+    def score_rows(self, rows, weights):
+        """Scores over all courses for a user who took ``rows`` with ``weights``."""
+        rows = np.asarray(rows, dtype=np.int64)
+        idx = self.neighbour_idx[rows]
+        sims = self.neighbour_sim[rows] * np.asarray(weights, dtype=np.float32)[:, None]
+        valid = idx >= 0
+        scores = np.bincount(idx[valid], weights=sims[valid], minlength=len(self.course_ids))
+        scores[rows] = 0
+        return scores
+
+    def score(self, course_ids, weights):
+        """``{course_id: score}`` for courses neighbouring the user's ``course_ids``, scaled to [0, 1]."""
+        known = [(self.rows[course_id], weight) for course_id, weight in zip(course_ids, weights)
+                 if course_id in self.rows]
+        if not known:
+            return {}
+        rows, weights = zip(*known)
+        scores = self.score_rows(rows, weights)
+        top = scores.max()
+        nonzero = np.flatnonzero(scores)
+        return dict(zip(self.course_ids[nonzero].tolist(), (scores[nonzero] / top).tolist())) if top > 0 else {}
+
+    @classmethod
+    def empty(cls, k):
+        """A snapshot without courses, served until the first build."""
+        return cls(0, [], [], np.full((0, k), -1, dtype=np.int32), np.zeros((0, k), dtype=np.float32))
+
+    def extended(self, course_ids):
+        """A copy with empty rows appended for ``course_ids``, ready for :meth:`refreshed`."""
+        n = len(course_ids)
+        return NeighbourSnapshot(
+            self.version, np.concatenate([self.course_ids, np.asarray(course_ids, dtype=np.int64)]),
+            np.concatenate([self.norms, np.zeros(n, dtype=np.float32)]),
+            np.vstack([self.neighbour_idx, np.full((n, self.k), -1, dtype=np.int32)]),
+            np.vstack([self.neighbour_sim, np.zeros((n, self.k), dtype=np.float32)]),
+        )
+
+    def refreshed(self, row, dots, norm):
+        """A copy with ``row``'s similarities recomputed from its column dot products.
+
+        ``dots[j]`` is the dot product of the course's interaction column with
+        course ``j``'s. Besides replacing the course's own neighbour list, the
+        course is inserted into, updated in or dropped from the lists of the
+        other courses as its new similarities require. A list the course
+        drops out of keeps a free slot until the next full build.
+        """
+        norms = self.norms.copy()
+        norms[row] = norm
+        denominator = norm * norms
+        sims = np.divide(dots, denominator, out=np.zeros(len(norms), dtype=np.float32), where=denominator > 0)
+        sims[row] = 0
+
+        neighbour_idx, neighbour_sim = self.neighbour_idx.copy(), self.neighbour_sim.copy()
+        idx, values = top_k(sims[None, :], self.k)
+        neighbour_idx[row, :idx.shape[1]], neighbour_sim[row, :values.shape[1]] = idx[0], values[0]
+
+        # Lists that already hold the course take its new similarity, or drop it
+        holders, positions = np.nonzero(neighbour_idx == row)
+        holders, positions = holders[holders != row], positions[holders != row]
+        neighbour_sim[holders, positions] = sims[holders]
+        dropped = sims[holders] <= 0
+        neighbour_idx[holders[dropped], positions[dropped]] = -1
+
+        # Other lists take it in place of their weakest entry if it beats it
+        candidates = np.flatnonzero(sims > 0)
+        candidates = np.setdiff1d(candidates, holders)
+        if len(candidates):
+            weakest = np.argmin(np.where(neighbour_idx[candidates] >= 0, neighbour_sim[candidates], -1), axis=1)
+            weakest_sim = np.where(
+                neighbour_idx[candidates, weakest] >= 0, neighbour_sim[candidates, weakest], -1
+            )
+            better = sims[candidates] > weakest_sim
+            neighbour_idx[candidates[better], weakest[better]] = row
+            neighbour_sim[candidates[better], weakest[better]] = sims[candidates[better]]
+
+        return NeighbourSnapshot(self.version, self.course_ids, norms, neighbour_idx, neighbour_sim)
+
+
+class CourseNeighbourModel:
+    """Process-wide item-item model, persisted to disk like the TF-IDF model.
+
+    A full build (``build_recommendation_model``) reads the whole history;
+    until one exists the model is empty. Afterwards new or changed history
+    rows only mark their course dirty, and new courses are appended. Dirty courses are refreshed together
+    after ``refresh_delay`` seconds on a background thread: the history of
+    the course's learners gives its exact new similarities, which patch the
+    neighbour lists. Other processes reload when the file changes.
+    """
+
+    def __init__(self, directory=None, k=None, refresh_delay=None):
+        self.directory = directory or getattr(
+            settings, 'RECOMMENDATION_MODEL_DIR',
+            os.path.join(settings.BASE_DIR, 'indexes', 'recommendations'),
+        )
+        self.k = k or getattr(settings, 'RECOMMENDATION_CF_NEIGHBOURS', 50)
+        self.refresh_delay = refresh_delay if refresh_delay is not None else getattr(
+            settings, 'RECOMMENDATION_CF_REFRESH_DELAY', 30
+        )
+        self._snapshot = None
+        self._mtime = None
+        self._dirty = set()
+        self._timer = None
+        self._lock = threading.RLock()
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, 'course_neighbours.npz')
+
+    def _file_lock(self):
+        return file_lock(os.path.join(self.directory, '.neighbours.lock'))
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def _save(self, snapshot):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self.path[:-4]}.{os.getpid()}.tmp.npz"
+        np.savez(
+            tmp_path, version=snapshot.version, course_ids=snapshot.course_ids, norms=snapshot.norms,
+            neighbour_idx=snapshot.neighbour_idx, neighbour_sim=snapshot.neighbour_sim,
+        )
+        os.replace(tmp_path, self.path)
+        return self._file_mtime()
+
+    def load(self):
+        """Load the persisted model if there is one; returns whether it was loaded."""
+        mtime = self._file_mtime()
+        if mtime is None:
+            return False
+        try:
+            with np.load(self.path) as data:
+                snapshot = NeighbourSnapshot(
+                    int(data['version']), data['course_ids'], data['norms'],
+                    data['neighbour_idx'], data['neighbour_sim'],
+                )
+        except (OSError, ValueError, KeyError):
+            return False
+        with self._lock:
+            self._snapshot, self._mtime = snapshot, mtime
+        return True
+
+    def get(self):
+        """Return the current snapshot, reloading it when needed, or an empty one before the first build."""
+        mtime = self._file_mtime()
+        with self._lock:
+            if self._snapshot is not None and (mtime is None or mtime == self._mtime):
+                return self._snapshot
+        if mtime is not None and self.load():
+            return self._snapshot
+        return NeighbourSnapshot.empty(self.k)
+
+    def _current(self):
+        """The latest snapshot on disk or in memory; call with the file lock held."""
+        mtime = self._file_mtime()
+        if mtime is not None and mtime != self._mtime:
+            self.load()
+        return self._snapshot
+
+    def rebuild(self, chunk_size=512):
+        """Build the neighbour lists from the whole history."""
+        course_ids = np.asarray(Course.objects.order_by('pk').values_list('pk', flat=True), dtype=np.int64)
+        course_rows = {int(course_id): row for row, course_id in enumerate(course_ids)}
+        user_rows, user_index, course_index, weights = {}, [], [], []
+        for user_id, course_id, rating, completed in UserLearningHistory.objects.values_list(
+            'user_id', 'course_id', 'rating', 'completed'
+        ).iterator(chunk_size=10000):
+            if course_id in course_rows:  # Skip courses created since the ids were read
+                user_index.append(user_rows.setdefault(user_id, len(user_rows)))
+                course_index.append(course_rows[course_id])
+                weights.append(interaction_weight(rating, completed))
+
+        matrix = interaction_matrix(user_index, course_index, weights, (len(user_rows), len(course_ids)))
+        norms, neighbour_idx, neighbour_sim = build_neighbours(matrix, self.k, chunk_size)
+        with self._file_lock():
+            current = self._current()
+            snapshot = NeighbourSnapshot(
+                current.version + 1 if current is not None else 1,
+                course_ids, norms, neighbour_idx, neighbour_sim,
+            )
+            mtime = self._save(snapshot)
+            with self._lock:
+                self._snapshot, self._mtime = snapshot, mtime
+        return snapshot
+
+    def update_courses(self, course_ids):
+        """Recompute the similarities of ``course_ids`` from their learners' history."""
+        with self._file_lock():
+            snapshot = self._current()
+            if snapshot is None:
+                return  # Nothing built yet; build_recommendation_model builds everything
+            new = [int(course_id) for course_id in course_ids if int(course_id) not in snapshot.rows]
+            if new:
+                # New courses get a row and column, filled in by their refresh below
+                new = list(Course.objects.filter(pk__in=new).values_list('pk', flat=True))
+                snapshot = snapshot.extended(new)
+                course_ids = [course_id for course_id in course_ids if int(course_id) in snapshot.rows]
+
+            for course_id in course_ids:
+                row = snapshot.rows[int(course_id)]
+                learners = UserLearningHistory.objects.filter(course_id=course_id).values('user_id')
+                history = [
+                    (user_id, other, rating, completed)
+                    for user_id, other, rating, completed in UserLearningHistory.objects.filter(
+                        user_id__in=learners
+                    ).values_list('user_id', 'course_id', 'rating', 'completed')
+                    if other in snapshot.rows
+                ]
+                user_rows = {}
+                matrix = interaction_matrix(
+                    [user_rows.setdefault(user_id, len(user_rows)) for user_id, _, _, _ in history],
+                    [snapshot.rows[other] for _, other, _, _ in history],
+                    [interaction_weight(rating, completed) for _, _, rating, completed in history],
+                    (len(user_rows), len(snapshot.course_ids)),
+                )
+                column = matrix[:, row]
+                dots = np.asarray((column.T @ matrix).todense()).ravel()
+                snapshot = snapshot.refreshed(row, dots, np.sqrt(column.multiply(column).sum()))
+
+            snapshot = NeighbourSnapshot(
+                snapshot.version + 1, snapshot.course_ids, snapshot.norms,
+                snapshot.neighbour_idx, snapshot.neighbour_sim,
+            )
+            mtime = self._save(snapshot)
+            with self._lock:
+                self._snapshot, self._mtime = snapshot, mtime
+
+    def mark_dirty(self, course_id):
+        """Queue ``course_id`` for the next background refresh."""
+        with self._lock:
+            self._dirty.add(int(course_id))
+            if self._timer is None:
+                self._timer = threading.Timer(self.refresh_delay, self._refresh_dirty)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _refresh_dirty(self):
+        with self._lock:
+            course_ids, self._dirty, self._timer = sorted(self._dirty), set(), None
+        try:
+            self.update_courses(course_ids)
+        finally:
+            connections.close_all()  # This thread's connections only
+
+
+course_neighbour_model = CourseNeighbourModel()
@@ -0,0 +1,75 @@
+import resource
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from education.collaborative import NeighbourSnapshot, build_neighbours, interaction_matrix
+
+
+class Command(BaseCommand):
+    help = (
+        'Build the item-item model on synthetic interactions, without touching the '
+        'database, and report build time, memory and per-user scoring latency.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--courses', type=int, default=10_000)
+        parser.add_argument('--per-user', type=int, default=20, help='Mean courses taken per user.')
+        parser.add_argument('--neighbours', type=int, default=50)
+        parser.add_argument('--chunk-size', type=int, default=512)
+        parser.add_argument('--queries', type=int, default=1000, help='Users scored for the latency figures.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        n_users, n_courses = options['users'], options['courses']
+
+        # Zipf-like course popularity and ratings of 1-5 stars
+        counts = rng.poisson(options['per_user'], n_users).clip(1, n_courses)
+        popularity = 1.0 / np.arange(1, n_courses + 1) ** 0.8
+        popularity /= popularity.sum()
+        user_index = np.repeat(np.arange(n_users), counts)
+        course_index = rng.choice(n_courses, size=counts.sum(), p=popularity)
+        weights = rng.integers(1, 6, size=counts.sum()) / 5.0
+        matrix = interaction_matrix(user_index, course_index, weights, (n_users, n_courses))
+        matrix.sum_duplicates()
+        matrix_bytes = matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+        self.stdout.write(
+            f"Interactions: {matrix.nnz:,} over {n_users:,} users x {n_courses:,} courses "
+            f"({matrix_bytes / 2 ** 20:.1f} MiB sparse)"
+        )
+
+        started = time.perf_counter()
+        norms, neighbour_idx, neighbour_sim = build_neighbours(matrix, options['neighbours'], options['chunk_size'])
+        build_seconds = time.perf_counter() - started
+        snapshot = NeighbourSnapshot(1, np.arange(n_courses), norms, neighbour_idx, neighbour_sim)
+        model_bytes = norms.nbytes + neighbour_idx.nbytes + neighbour_sim.nbytes
+        self.stdout.write(f"Build: {build_seconds:.1f}s, model {model_bytes / 2 ** 20:.1f} MiB")
+
+        users = rng.choice(n_users, size=min(options['queries'], n_users), replace=False)
+        latencies = []
+        for user in users:
+            row = matrix.getrow(user)
+            started = time.perf_counter()
+            scores = snapshot.score_rows(row.indices, row.data)
+            np.argpartition(-scores, 9)[:10]
+            latencies.append(time.perf_counter() - started)
+        latencies_ms = np.asarray(latencies) * 1000
+        self.stdout.write(
+            f"Scoring: p50={np.percentile(latencies_ms, 50):.2f}ms "
+            f"p95={np.percentile(latencies_ms, 95):.2f}ms p99={np.percentile(latencies_ms, 99):.2f}ms"
+        )
+
+        # Incremental refresh of one popular course after a new rating
+        column = matrix.tocsc()[:, 0]
+        learners = matrix[column.indices]
+        started = time.perf_counter()
+        dots = np.asarray((learners[:, 0].T @ learners).todense()).ravel()
+        snapshot.refreshed(0, dots, np.sqrt(learners[:, 0].multiply(learners[:, 0]).sum()))
+        self.stdout.write(
+            f"Refresh of the most popular course ({column.nnz:,} learners): "
+            f"{(time.perf_counter() - started) * 1000:.1f}ms"
+        )
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+        self.stdout.write(f"Peak resident memory of this process: {peak:.0f} MiB")
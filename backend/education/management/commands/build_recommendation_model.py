@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from education.collaborative import course_neighbour_model
+from education.recommendation_model import course_tfidf_model
+
+
+class Command(BaseCommand):
+    help = 'Refit the course TF-IDF and item-item models and persist them for the web workers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-neighbours', action='store_true',
+                            help='Only refit the TF-IDF model.')
+
+    def handle(self, *args, **options):
+        snapshot = course_tfidf_model.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Built model v{snapshot.version}: {len(snapshot.course_ids)} courses, "
+            f"{len(snapshot.vocabulary)} terms, written to {course_tfidf_model.directory}"
+        ))
+        if not options['skip_neighbours']:
+            neighbours = course_neighbour_model.rebuild()
+            self.stdout.write(self.style.SUCCESS(
+                f"Built neighbours v{neighbours.version}: {len(neighbours.course_ids)} courses, "
+                f"{int((neighbours.neighbour_idx >= 0).sum())} neighbour links"
+            ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from education.profiles import rebuild_profiles
+
+
+class Command(BaseCommand):
+    help = 'Recompute user preference profiles from UserLearningHistory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, nargs='+', dest='user_ids',
+                            help='Only rebuild these user ids (default: every user with history).')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Profiles written per upsert.')
+
+    def handle(self, *args, **options):
+        written = rebuild_profiles(options['user_ids'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} preference profiles."))
@@ -47,6 +47,19 @@ class UserLearningHistory(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.course.title}"
 
+class UserPreferenceProfile(models.Model):
+    """Running sums over a user's learning history, kept up to date by signals."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='preference_profile')
+    history_count = models.IntegerField(default=0)
+    difficulty_stats = models.JSONField(default=dict)  # level -> [count, rating sum, rated count]
+    tag_stats = models.JSONField(default=dict)  # tag id -> [count, rating sum, rated count]
+    price_sum = models.FloatField(default=0)
+    price_sum_squares = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.history_count} courses"
+
 class Book(models.Model):
     title = models.CharField(max_length=200)
     author = models.CharField(max_length=200)
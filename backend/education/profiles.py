@@ -0,0 +1,143 @@
+"""Per-user preference profiles maintained from ``UserLearningHistory``.
+
+A profile holds counts and rating sums per difficulty level and tag plus the
+sum and sum of squares of course prices, so preferences are read with one
+indexed lookup instead of aggregating the history. Each history row adds the
+contribution of its course and rating; signals apply the difference when a
+row is created, re-rated or deleted. Course edits are not propagated, so
+``rebuild_preference_profiles`` recomputes profiles from scratch for repair.
+"""
+import math
+from collections import defaultdict
+
+from django.db import transaction
+from .models import Course, UserLearningHistory, UserPreferenceProfile
+
+
+def _add(stats, key, rating, sign):
+    key = str(key)
+    count, rating_sum, rated = stats.get(key, (0, 0, 0))
+    count += sign
+    if rating is not None:
+        rating_sum += sign * rating
+        rated += sign
+    if count > 0:
+        stats[key] = [count, rating_sum, rated]
+    else:
+        stats.pop(key, None)
+
+
+def apply(profile, difficulty, price, tag_ids, rating, sign=1):
+    """Add (``sign=1``) or remove (``sign=-1``) one history row's contribution."""
+    profile.history_count += sign
+    _add(profile.difficulty_stats, difficulty, rating, sign)
+    for tag_id in tag_ids:
+        _add(profile.tag_stats, tag_id, rating, sign)
+    price = float(price)
+    profile.price_sum += sign * price
+    profile.price_sum_squares += sign * price * price
+    if profile.history_count <= 0:  # Clear float drift once the history is empty
+        profile.history_count, profile.price_sum, profile.price_sum_squares = 0, 0.0, 0.0
+
+
+def _course_attributes(course_id):
+    course = Course.objects.filter(pk=course_id).values('difficulty_level', 'price').first()
+    if course is None:
+        return None
+    tag_ids = list(Course.tags.through.objects.filter(course_id=course_id).values_list('coursetag_id', flat=True))
+    return course['difficulty_level'], course['price'], tag_ids
+
+
+def apply_history_change(user_id, old=None, new=None):
+    """Move a profile from history row state ``old`` to ``new``, each ``(course_id, rating)`` or None."""
+    if old == new:
+        return
+    with transaction.atomic():
+        profile, created = UserPreferenceProfile.objects.select_for_update().get_or_create(user_id=user_id)
+        if created:
+            # Built from the history, which already includes this change
+            rebuild_profiles([user_id])
+            return
+        for state, sign in ((old, -1), (new, 1)):
+            if state is None:
+                continue
+            attributes = _course_attributes(state[0])
+            if attributes is not None:
+                apply(profile, *attributes, state[1], sign)
+        profile.save()
+
+
+def rebuild_profiles(user_ids=None, chunk_size=2000):
+    """Recompute profiles from the history, for ``user_ids`` or every user with history.
+
+    Streams the history ordered by user and writes each chunk of profiles
+    with one upsert; returns the number of profiles written.
+    """
+    tags = defaultdict(list)
+    for course_id, tag_id in Course.tags.through.objects.values_list('course_id', 'coursetag_id').iterator():
+        tags[course_id].append(tag_id)
+
+    history = UserLearningHistory.objects.order_by('user_id')
+    if user_ids is not None:
+        history = history.filter(user_id__in=user_ids)
+    rows = history.values_list('user_id', 'course_id', 'course__difficulty_level', 'course__price', 'rating')
+
+    profiles, written = {}, 0
+    if user_ids is not None:
+        profiles = {user_id: UserPreferenceProfile(user_id=user_id) for user_id in user_ids}
+
+    def flush():
+        UserPreferenceProfile.objects.bulk_create(
+            profiles.values(), update_conflicts=True, unique_fields=['user'],
+            update_fields=['history_count', 'difficulty_stats', 'tag_stats', 'price_sum', 'price_sum_squares', 'updated_at'],
+        )
+        return len(profiles)
+
+    for user_id, course_id, difficulty, price, rating in rows.iterator():
+        profile = profiles.get(user_id)
+        if profile is None:
+            if user_ids is None and len(profiles) >= chunk_size:
+                written += flush()
+                profiles = {}
+            profile = profiles[user_id] = UserPreferenceProfile(user_id=user_id)
+        apply(profile, difficulty, price, tags[course_id], rating)
+    if profiles:
+        written += flush()
+    return written
+
+
+def get_profile(user):
+    """The user's profile, built from their history the first time."""
+    profile = UserPreferenceProfile.objects.filter(user=user).first()
+    if profile is None:
+        rebuild_profiles([user.pk])
+        profile = UserPreferenceProfile.objects.get(user=user)
+    return profile
+
+
+def preferences(profile, tag_names):
+    """The ``get_user_preferences`` dict for ``profile``; ``tag_names`` maps tag ids to names."""
+    def average(stats):
+        return stats[1] / stats[2] if stats[2] else None
+
+    # Best average rating wins; levels without ratings only by count
+    difficulty = max(
+        profile.difficulty_stats.items(),
+        key=lambda item: (item[1][2] > 0, average(item[1]) or 0, item[1][0]),
+        default=(None, None),
+    )[0]
+
+    tag_preferences = []
+    for tag_id, stats in profile.tag_stats.items():
+        name = tag_names.get(int(tag_id))
+        if name is not None and stats[2]:
+            tag_preferences.append({'tag': name, 'weight': average(stats) * stats[0]})
+
+    price_range = None
+    if profile.history_count:
+        mean = profile.price_sum / profile.history_count
+        std = math.sqrt(max(profile.price_sum_squares / profile.history_count - mean * mean, 0))
+        if mean:
+            price_range = {'min': mean - std, 'max': mean + std}
+
+    return {'difficulty_level': difficulty, 'tag_preferences': tag_preferences, 'price_range': price_range}
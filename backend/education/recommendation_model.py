@@ -0,0 +1,324 @@
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from .models import Course, CourseTag
+
+MATRIX_FILE_RE = re.compile(r"^(course_tfidf|course_tags)_v(\d+)\.npz$")
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, last writer wins
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path):
+    """Serialize read-modify-write cycles across worker processes."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def course_text(course, tag_names):
+    """Text a course is vectorized from."""
+    return f"{course.title} {course.description} {' '.join(tag_names)} {course.difficulty_level}"
+
+
+class TfidfSnapshot:
+    """One immutable version of the fitted vectorizer and course matrix.
+
+    Updates build a new snapshot and swap it in, so a request keeps scoring
+    against a consistent model while another thread or process refreshes it.
+    Rows of ``matrix`` are L2-normalized and, like the ``difficulty`` and
+    ``price`` arrays, follow ``course_ids``. ``mean_similarity`` holds each
+    course's mean cosine similarity to the whole catalog. ``tags`` is the
+    binary course x ``CourseTag`` incidence matrix, with columns following
+    ``tag_ids`` and ``tag_names``.
+    """
+
+    def __init__(self, version, course_ids, vocabulary, idf, matrix, difficulty, price,
+                 tag_ids, tag_names, tags, refit_pending=0):
+        self.version = version
+        self.course_ids = np.asarray(course_ids, dtype=np.int64)
+        self.rows = {int(course_id): row for row, course_id in enumerate(self.course_ids)}
+        self.vocabulary = vocabulary
+        self.idf = np.asarray(idf, dtype=np.float64)
+        self.matrix = matrix.tocsr()
+        self.difficulty = np.asarray(difficulty, dtype=object)
+        self.price = np.asarray(price, dtype=np.float64)
+        self.tag_ids = np.asarray(tag_ids, dtype=np.int64)
+        self.tag_names = list(tag_names)
+        self.tag_columns = {name: column for column, name in enumerate(self.tag_names)}
+        self.tags = tags.tocsr()
+        self.refit_pending = refit_pending  # Courses changed since the vocabulary was fitted
+
+        # mean_j(a_i . a_j) == a_i . sum_j(a_j) / n, so this is one pass over the matrix
+        n = self.matrix.shape[0]
+        column_sums = np.asarray(self.matrix.sum(axis=0)).ravel()
+        self.mean_similarity = self.matrix @ column_sums / n if n else np.zeros(0)
+
+        self.vectorizer = TfidfVectorizer(stop_words='english', vocabulary=vocabulary)
+        if vocabulary:
+            self.vectorizer.idf_ = self.idf
+
+    def transform(self, texts):
+        if not self.vocabulary:
+            return sparse.csr_matrix((len(texts), 0))
+        return self.vectorizer.transform(texts)
+
+    def tag_scores(self, weights):
+        """Sum of ``{tag name: weight}`` over each course's tags, for the whole catalog."""
+        vector = np.zeros(len(self.tag_names))
+        for name, weight in weights.items():
+            column = self.tag_columns.get(name)
+            if column is not None:
+                vector[column] = weight
+        return self.tags @ vector
+
+    def tag_mask(self, names, match_all=False):
+        """Boolean row mask of courses tagged with any (or all) of ``names``."""
+        names = set(names)
+        columns = [self.tag_columns[name] for name in names if name in self.tag_columns]
+        if not columns or (match_all and len(columns) < len(names)):
+            return np.zeros(len(self.course_ids), dtype=bool)
+        counts = np.asarray(self.tags[:, columns].sum(axis=1)).ravel()
+        return counts >= len(columns) if match_all else counts > 0
+
+    def tag_counts(self, mask=None):
+        """``{tag name: course count}`` over all courses or the rows in ``mask``."""
+        tags = self.tags if mask is None else self.tags[mask]
+        counts = np.asarray(tags.sum(axis=0)).ravel()
+        return {self.tag_names[column]: int(counts[column]) for column in np.flatnonzero(counts)}
+
+
+class CourseTfidfModel:
+    """Process-wide TF-IDF model of the course catalog, persisted to disk.
+
+    The TF-IDF and tag matrices are stored as sparse ``.npz`` files next to a
+    JSON file holding the version, course ids, vocabulary, idf weights and
+    per-course attributes, so worker processes load the model at startup
+    instead of refitting it. ``Course`` and ``CourseTag`` signals patch
+    single rows with the fitted vocabulary; once
+    ``refit_ratio`` of the catalog has changed this way the vectorizer is
+    refitted from scratch. Other processes reload when the JSON file changes.
+    """
+
+    def __init__(self, directory=None, refit_ratio=None):
+        self.directory = directory or getattr(
+            settings, 'RECOMMENDATION_MODEL_DIR',
+            os.path.join(settings.BASE_DIR, 'indexes', 'recommendations'),
+        )
+        self.refit_ratio = refit_ratio if refit_ratio is not None else getattr(
+            settings, 'RECOMMENDATION_REFIT_RATIO', 0.2
+        )
+        self._snapshot = None
+        self._mtime = None
+        self._lock = threading.RLock()
+
+    @property
+    def meta_path(self):
+        return os.path.join(self.directory, 'course_tfidf.json')
+
+    def matrix_path(self, version, name='course_tfidf'):
+        return os.path.join(self.directory, f"{name}_v{version}.npz")
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.meta_path).st_mtime
+        except OSError:
+            return None
+
+    def _file_lock(self):
+        return file_lock(os.path.join(self.directory, '.lock'))
+
+    def _save(self, snapshot):
+        for name, matrix in (('course_tfidf', snapshot.matrix), ('course_tags', snapshot.tags)):
+            matrix_path = self.matrix_path(snapshot.version, name)
+            # save_npz appends .npz to names without it, so keep the suffix last
+            tmp_matrix_path = f"{matrix_path[:-4]}.{os.getpid()}.tmp.npz"
+            sparse.save_npz(tmp_matrix_path, matrix)
+            os.replace(tmp_matrix_path, matrix_path)
+
+        meta = {
+            'version': snapshot.version,
+            'course_ids': snapshot.course_ids.tolist(),
+            'vocabulary': snapshot.vocabulary,
+            'idf': snapshot.idf.tolist(),
+            'difficulty': snapshot.difficulty.tolist(),
+            'price': snapshot.price.tolist(),
+            'tag_ids': snapshot.tag_ids.tolist(),
+            'tag_names': snapshot.tag_names,
+            'refit_pending': snapshot.refit_pending,
+        }
+        tmp_meta_path = f"{self.meta_path}.{os.getpid()}.tmp"
+        with open(tmp_meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta_path, self.meta_path)
+
+        # Keep the previous matrices for processes that read the old metadata
+        for name in os.listdir(self.directory):
+            match = MATRIX_FILE_RE.match(name)
+            if match and int(match.group(2)) < snapshot.version - 1:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+        return self._file_mtime()
+
+    def _read(self):
+        with open(self.meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        return TfidfSnapshot(
+            meta['version'], meta['course_ids'], meta['vocabulary'], meta['idf'],
+            sparse.load_npz(self.matrix_path(meta['version'])),
+            meta['difficulty'], meta['price'], meta['tag_ids'], meta['tag_names'],
+            sparse.load_npz(self.matrix_path(meta['version'], 'course_tags')),
+            meta.get('refit_pending', 0),
+        )
+
+    def load(self):
+        """Load the persisted model if there is one; returns whether it was loaded."""
+        mtime = self._file_mtime()
+        if mtime is None:
+            return False
+        try:
+            snapshot = self._read()
+        except (OSError, ValueError, KeyError):
+            return False
+        with self._lock:
+            self._snapshot, self._mtime = snapshot, mtime
+        return True
+
+    def get(self):
+        """Return the current snapshot, reloading or building it when needed."""
+        mtime = self._file_mtime()
+        with self._lock:
+            if self._snapshot is not None and (mtime is None or mtime == self._mtime):
+                return self._snapshot
+        if mtime is not None and self.load():
+            return self._snapshot
+        return self.rebuild()
+
+    def _current(self):
+        """The latest snapshot on disk or in memory; call with the file lock held."""
+        mtime = self._file_mtime()
+        if mtime is not None and mtime != self._mtime:
+            self.load()
+        return self._snapshot
+
+    def _next_version(self):
+        current = self._current()
+        return current.version + 1 if current is not None else 1
+
+    @staticmethod
+    def _tag_rows(courses, tag_ids, tag_names):
+        """Incidence rows for ``courses``, adding columns for tags not seen yet."""
+        tag_ids, tag_names = [int(tag_id) for tag_id in tag_ids], list(tag_names)
+        columns = {tag_id: column for column, tag_id in enumerate(tag_ids)}
+        rows, cols = [], []
+        for row, course in enumerate(courses):
+            for tag in course.tags.all():
+                column = columns.get(tag.pk)
+                if column is None:
+                    column = columns[tag.pk] = len(tag_ids)
+                    tag_ids.append(tag.pk)
+                    tag_names.append(tag.name)
+                else:
+                    tag_names[column] = tag.name  # Picks up renames
+                rows.append(row)
+                cols.append(column)
+        matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(len(courses), len(tag_ids))
+        )
+        return tag_ids, tag_names, matrix
+
+    def rebuild(self):
+        """Refit the vectorizer on the whole catalog."""
+        courses = list(Course.objects.prefetch_related('tags').order_by('pk'))
+        texts = [course_text(course, [tag.name for tag in course.tags.all()]) for course in courses]
+        vectorizer = TfidfVectorizer(stop_words='english')
+        try:
+            matrix = vectorizer.fit_transform(texts)
+            vocabulary = {term: int(index) for term, index in vectorizer.vocabulary_.items()}
+            idf = vectorizer.idf_
+        except ValueError:  # Empty catalog or only stop words
+            matrix, vocabulary, idf = sparse.csr_matrix((len(courses), 0)), {}, []
+        all_tags = list(CourseTag.objects.order_by('pk').values_list('pk', 'name'))
+        tag_ids, tag_names, tags = self._tag_rows(
+            courses, [tag_id for tag_id, _ in all_tags], [name for _, name in all_tags]
+        )
+
+        with self._lock, self._file_lock():
+            snapshot = TfidfSnapshot(
+                self._next_version(), [course.pk for course in courses], vocabulary, idf, matrix,
+                [course.difficulty_level for course in courses], [float(course.price) for course in courses],
+                tag_ids, tag_names, tags,
+            )
+            self._mtime = self._save(snapshot)
+            self._snapshot = snapshot
+        return snapshot
+
+    def _patch(self, courses):
+        """Re-vectorize ``{course_id: course}`` (None drops the course) and persist.
+
+        Returns False when the change should be a full refit instead.
+        """
+        with self._lock, self._file_lock():
+            current = self._current()
+            if current is None:
+                return True  # Nothing built yet; the first get() fits everything
+            if current.refit_pending + len(courses) > self.refit_ratio * max(len(current.course_ids), 1):
+                return False
+
+            keep = [current.rows[course_id] for course_id in current.rows if course_id not in courses]
+            new = [course for course in courses.values() if course is not None]
+            matrix = current.matrix[keep]
+            if new:
+                texts = [course_text(course, [tag.name for tag in course.tags.all()]) for course in new]
+                matrix = sparse.vstack([matrix, current.transform(texts)])
+            tag_ids, tag_names, new_tags = self._tag_rows(new, current.tag_ids, current.tag_names)
+            kept_tags = current.tags[keep]
+            kept_tags = sparse.csr_matrix(
+                (kept_tags.data, kept_tags.indices, kept_tags.indptr), shape=(len(keep), len(tag_ids))
+            )
+
+            snapshot = TfidfSnapshot(
+                current.version + 1,
+                np.concatenate([current.course_ids[keep], [course.pk for course in new]]),
+                current.vocabulary, current.idf, matrix,
+                np.concatenate([current.difficulty[keep], [course.difficulty_level for course in new]]),
+                np.concatenate([current.price[keep], [float(course.price) for course in new]]),
+                tag_ids, tag_names, sparse.vstack([kept_tags, new_tags]),
+                current.refit_pending + len(courses),
+            )
+            self._mtime = self._save(snapshot)
+            self._snapshot = snapshot
+        return True
+
+    def update_courses(self, course_ids):
+        """Re-vectorize ``course_ids`` with the fitted vocabulary."""
+        courses = {int(course_id): None for course_id in course_ids}
+        courses.update(Course.objects.prefetch_related('tags').in_bulk(list(courses)))
+        if courses and not self._patch(courses):
+            self.rebuild()
+
+    def remove_courses(self, course_ids):
+        courses = {int(course_id): None for course_id in course_ids}
+        if courses and not self._patch(courses):
+            self.rebuild()
+
+
+course_tfidf_model = CourseTfidfModel()
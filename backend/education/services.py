@@ -1,106 +1,79 @@
-from django.db.models import Avg, Count, StdDev
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
-from .models import Course, UserLearningHistory, CourseTag
+from django.conf import settings
+from .collaborative import course_neighbour_model, interaction_weight
+from .models import Course, UserLearningHistory
+from .profiles import get_profile, preferences
+from .recommendation_model import course_tfidf_model
 
 class RecommendationService:
     def __init__(self):
-        self.vectorizer = TfidfVectorizer(stop_words='english')
-        self.course_vectors = None
-        self.courses = None
+        self.model = None
         self._initialize_vectors()
 
     def _initialize_vectors(self):
-        """Initialize course vectors using TF-IDF"""
-        self.courses = Course.objects.all()
-        course_texts = [
-            f"{course.title} {course.description} {' '.join(tag.name for tag in course.tags.all())} {course.difficulty_level}"
-            for course in self.courses
-        ]
-        self.course_vectors = self.vectorizer.fit_transform(course_texts)
+        """Use the shared TF-IDF model instead of refitting it per request"""
+        self.model = course_tfidf_model.get()
 
     def get_user_preferences(self, user):
-        """Extract user preferences from learning history"""
-        history = UserLearningHistory.objects.filter(user=user)
-        
-        # Get average difficulty level preference
-        difficulty_pref = history.values('course__difficulty_level').annotate(
-            avg_rating=Avg('rating'),
-            count=Count('id')
-        ).order_by('-avg_rating').first()
-        
-        # Get preferred tags
-        tag_preferences = history.values('course__tags__name').annotate(
-            count=Count('id'),
-            avg_rating=Avg('rating')
-        ).filter(course__tags__name__isnull=False)
-        
-        # Get preferred price range
-        price_pref = history.aggregate(
-            avg_price=Avg('course__price'),
-            price_std=StdDev('course__price')
-        )
-        
-        return {
-            'difficulty_level': difficulty_pref['course__difficulty_level'] if difficulty_pref else None,
-            'tag_preferences': [
-                {'tag': pref['course__tags__name'], 'weight': pref['avg_rating'] * pref['count']}
-                for pref in tag_preferences
-            ],
-            'price_range': {
-                'min': price_pref['avg_price'] - price_pref['price_std'],
-                'max': price_pref['avg_price'] + price_pref['price_std']
-            } if price_pref['avg_price'] else None
-        }
+        """Extract user preferences from the stored preference profile"""
+        profile = get_profile(user)
+        return preferences(profile, dict(zip(self.model.tag_ids.tolist(), self.model.tag_names)))
 
     def get_recommendations(self, user, limit=5):
-        """Get personalized course recommendations for a user"""
+        """Get personalized course recommendations for a user
+
+        Every course is scored at once with array operations over the shared
+        model, so the cost grows linearly with the catalog.
+        """
+        model = self.model
         preferences = self.get_user_preferences(user)
-        
+
         # Get courses the user hasn't taken yet
-        taken_courses = set(UserLearningHistory.objects.filter(user=user).values_list('course_id', flat=True))
-        available_courses = [course for course in self.courses if course.id not in taken_courses]
-        
-        if not available_courses:
+        history = list(UserLearningHistory.objects.filter(user=user).values_list('course_id', 'rating', 'completed'))
+        taken_courses = [course_id for course_id, _, _ in history]
+        available = ~np.isin(model.course_ids, taken_courses)
+        if not available.any():
             return []
-        
-        # Calculate similarity scores
-        course_scores = []
-        for course in available_courses:
-            score = 0
-            
-            # Content-based similarity
-            course_text = f"{course.title} {course.description} {' '.join(tag.name for tag in course.tags.all())} {course.difficulty_level}"
-            course_vector = self.vectorizer.transform([course_text])
-            similarity = cosine_similarity(course_vector, self.course_vectors).flatten()
-            score += np.mean(similarity) * 0.4  # 40% weight for content similarity
-            
-            # Difficulty level match
-            if preferences['difficulty_level'] and course.difficulty_level == preferences['difficulty_level']:
-                score += 0.2  # 20% weight for difficulty match
-            
-            # Tag preferences
-            if preferences['tag_preferences']:
-                course_tags = set(course.tags.values_list('name', flat=True))
-                tag_score = sum(
-                    pref['weight'] for pref in preferences['tag_preferences']
-                    if pref['tag'] in course_tags
-                )
-                score += tag_score * 0.2  # 20% weight for tag preferences
-            
-            # Price range match
-            if preferences['price_range']:
-                price_range = preferences['price_range']
-                if price_range['min'] <= course.price <= price_range['max']:
-                    score += 0.2  # 20% weight for price range match
-            
-            course_scores.append((course, score))
-        
-        # Sort by score and return top recommendations
-        course_scores.sort(key=lambda x: x[1], reverse=True)
-        return [course for course, _ in course_scores[:limit]]
+
+        # Content-based similarity, 40% weight
+        scores = model.mean_similarity * 0.4
+
+        # Difficulty level match, 20% weight
+        if preferences['difficulty_level']:
+            scores += (model.difficulty == preferences['difficulty_level']) * 0.2
+
+        # Tag preferences, 20% weight
+        if preferences['tag_preferences']:
+            weights = {pref['tag']: pref['weight'] for pref in preferences['tag_preferences']}
+            scores += model.tag_scores(weights) * 0.2
+
+        # Price range match, 20% weight
+        if preferences['price_range']:
+            price_range = preferences['price_range']
+            scores += ((model.price >= float(price_range['min'])) & (model.price <= float(price_range['max']))) * 0.2
+
+        # Courses that learners with similar histories took, blended in on top
+        cf_weight = getattr(settings, 'RECOMMENDATION_CF_WEIGHT', 0.3)
+        if cf_weight and history:
+            neighbour_scores = course_neighbour_model.get().score(
+                taken_courses, [interaction_weight(rating, completed) for _, rating, completed in history]
+            )
+            for course_id, cf_score in neighbour_scores.items():
+                row = model.rows.get(course_id)
+                if row is not None:
+                    scores[row] += cf_score * cf_weight
+
+        # Top-k without sorting the whole catalog
+        candidates = np.flatnonzero(available)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+
+        course_ids = model.course_ids[candidates].tolist()
+        courses = Course.objects.in_bulk(course_ids)
+        return [courses[course_id] for course_id in course_ids if course_id in courses]
 
     def update_recommendations(self):
-        """Update course vectors when new courses are added"""
+        """Refit the shared model on the whole catalog"""
+        course_tfidf_model.rebuild()
         self._initialize_vectors() 
\ No newline at end of file
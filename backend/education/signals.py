@@ -0,0 +1,113 @@
+import logging
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+from .collaborative import course_neighbour_model
+from .models import Course, CourseTag, UserLearningHistory
+from .profiles import apply_history_change
+from .recommendation_model import course_tfidf_model
+
+logger = logging.getLogger(__name__)
+
+
+def on_commit(func, course_ids):
+    """Call ``func(course_ids)`` once the transaction commits, logging failures.
+
+    Model files are only patched for committed rows, and a write error never
+    fails the save; ``build_recommendation_model`` repairs what it missed.
+    """
+    course_ids = list(course_ids)
+
+    def run():
+        try:
+            func(course_ids)
+        except Exception:
+            logger.exception("Updating the recommendation model for courses %s failed", course_ids)
+    transaction.on_commit(run)
+
+
+def update_course_vectors(course_ids):
+    on_commit(course_tfidf_model.update_courses, course_ids)
+
+
+@receiver(post_save, sender=Course)
+def update_course_vector(sender, instance, **kwargs):
+    update_course_vectors([instance.pk])
+
+
+@receiver(post_delete, sender=Course)
+def remove_course_vector(sender, instance, **kwargs):
+    on_commit(course_tfidf_model.remove_courses, [instance.pk])
+
+
+@receiver(m2m_changed, sender=Course.tags.through)
+def update_tagged_course_vectors(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear', 'pre_clear'):
+        return
+    if not reverse:
+        if action != 'pre_clear':
+            update_course_vectors([instance.pk])
+    elif action == 'pre_clear':
+        # pk_set is not sent on clear, so remember the courses beforehand
+        instance._cleared_course_ids = list(instance.course_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        update_course_vectors(getattr(instance, '_cleared_course_ids', []))
+    else:
+        update_course_vectors(pk_set)
+
+
+@receiver(post_save, sender=CourseTag)
+def update_renamed_tag_vectors(sender, instance, created, **kwargs):
+    if not created:
+        update_course_vectors(instance.course_set.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=CourseTag)
+def remember_tagged_courses(sender, instance, **kwargs):
+    # Deleting a tag drops its course links without an m2m_changed signal
+    instance._deleted_course_ids = list(instance.course_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=CourseTag)
+def update_untagged_course_vectors(sender, instance, **kwargs):
+    update_course_vectors(getattr(instance, '_deleted_course_ids', []))
+
+
+@receiver(post_init, sender=UserLearningHistory)
+def remember_history_state(sender, instance, **kwargs):
+    instance._profile_state = (instance.course_id, instance.rating) if instance.pk else None
+    instance._interaction = (instance.course_id, instance.rating, instance.completed) if instance.pk else None
+
+
+@receiver(post_save, sender=UserLearningHistory)
+def update_preference_profile(sender, instance, **kwargs):
+    state = (instance.course_id, instance.rating)
+    apply_history_change(instance.user_id, old=getattr(instance, '_profile_state', None), new=state)
+    instance._profile_state = state
+
+
+@receiver(post_delete, sender=UserLearningHistory)
+def remove_from_preference_profile(sender, instance, **kwargs):
+    apply_history_change(instance.user_id, old=getattr(instance, '_profile_state', None))
+
+
+def mark_neighbours_dirty(course_ids):
+    def mark(course_ids):
+        for course_id in course_ids:
+            course_neighbour_model.mark_dirty(course_id)
+    on_commit(mark, course_ids)
+
+
+@receiver(post_save, sender=UserLearningHistory)
+def update_course_neighbours(sender, instance, **kwargs):
+    interaction = (instance.course_id, instance.rating, instance.completed)
+    previous = getattr(instance, '_interaction', None)
+    if previous != interaction:  # Progress alone leaves the interaction weight unchanged
+        mark_neighbours_dirty({instance.course_id, previous[0]} if previous else {instance.course_id})
+    instance._interaction = interaction
+
+
+@receiver(post_delete, sender=UserLearningHistory)
+def remove_from_course_neighbours(sender, instance, **kwargs):
+    mark_neighbours_dirty({instance.course_id})
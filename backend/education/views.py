@@ -1,3 +1,4 @@
+import numpy as np
 from django.shortcuts import render
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
@@ -9,6 +10,7 @@ from .serializers import (
     CourseSerializer, BookSerializer, UserLearningHistorySerializer,
     TestSerializer, QuestionSerializer, ChoiceSerializer, UserTestAttemptSerializer
 )
+from .recommendation_model import course_tfidf_model
 from .services import RecommendationService
 
 # Create your views here.
@@ -26,10 +28,19 @@ class CourseViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         queryset = Course.objects.all()
-        if self.action == 'list':
+        if self.action in ('list', 'tag_facets'):
             instructor_id = self.request.query_params.get('instructor', None)
             if instructor_id:
                 queryset = queryset.filter(instructor_id=instructor_id)
+            tags = self.request.query_params.get('tags', None)
+            if tags:
+                # ?tags=a,b matches any of the tags, add &tag_match=all for every tag
+                model = course_tfidf_model.get()
+                mask = model.tag_mask(
+                    [tag.strip() for tag in tags.split(',') if tag.strip()],
+                    match_all=self.request.query_params.get('tag_match') == 'all',
+                )
+                queryset = queryset.filter(id__in=model.course_ids[mask].tolist())
         return queryset
 
     @action(detail=True, methods=['get'])
@@ -39,6 +50,18 @@ class CourseViewSet(viewsets.ModelViewSet):
         serializer = BookSerializer(books, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def tag_facets(self, request):
+        """Number of courses per tag among the courses matching the list filters."""
+        model = course_tfidf_model.get()
+        rows = [model.rows[course_id] for course_id in self.get_queryset().values_list('id', flat=True)
+                if course_id in model.rows]
+        counts = model.tag_counts(np.asarray(rows, dtype=np.int64))
+        return Response([
+            {'tag': tag, 'count': count}
+            for tag, count in sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+        ])
+
     @action(detail=False, methods=['get'])
     def recommendations(self, request):
         recommendation_service = RecommendationService()
@@ -141,4 +141,54 @@ CORS_ALLOWED_ORIGINS = os.getenv('CORS_ORIGIN_WHITELIST', 'http://localhost:5173
 CORS_ALLOW_CREDENTIALS = True
 
 # OpenAI settings
-OPENAI_API_KEY = os.getenv('OPENAI_API_KEY') 
\ No newline at end of file
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY') 
+
+# AI recommendation settings
+AI_SCORING_MATRIX_TTL = int(os.getenv('AI_SCORING_MATRIX_TTL', 300))
+AI_REASON_MAX_WORKERS = int(os.getenv('AI_REASON_MAX_WORKERS', 5))
+AI_REASON_TIME_BUDGET = float(os.getenv('AI_REASON_TIME_BUDGET', 3.0))
+AI_REASON_CACHE_SIZE = int(os.getenv('AI_REASON_CACHE_SIZE', 10000))
+AI_REASON_CACHE_TTL = int(os.getenv('AI_REASON_CACHE_TTL', 24 * 60 * 60))
+AI_EMBEDDING_BATCH_SIZE = int(os.getenv('AI_EMBEDDING_BATCH_SIZE', 100))
+AI_ANN_ENABLED = os.getenv('AI_ANN_ENABLED', 'True') == 'True'
+AI_ANN_PRELOAD = os.getenv('AI_ANN_PRELOAD', 'True') == 'True'
+AI_ANN_INDEX_PATH = os.getenv('AI_ANN_INDEX_PATH', os.path.join(BASE_DIR, 'indexes', 'course_ann.npz'))
+AI_ANN_N_PROBE = int(os.getenv('AI_ANN_N_PROBE', 8))
+AI_RECOMMENDATION_MAX_AGE = int(os.getenv('AI_RECOMMENDATION_MAX_AGE')) if os.getenv('AI_RECOMMENDATION_MAX_AGE') else None
+AI_EMBEDDING_PROVIDER = os.getenv('AI_EMBEDDING_PROVIDER', 'openai')  # 'openai', 'local' or a dotted path
+AI_EMBEDDING_OPTIONS = {}
+
+# AI chat settings
+AI_CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv('AI_CHAT_HISTORY_TOKEN_BUDGET', 3000))
+AI_CHAT_SUMMARY_MODEL = os.getenv('AI_CHAT_SUMMARY_MODEL', 'gpt-3.5-turbo')
+
+# OpenAI client settings
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1')  # Point at a stub server for benchmarks
+OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', 30.0))
+OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', 4))
+OPENAI_MAX_CONCURRENCY = int(os.getenv('OPENAI_MAX_CONCURRENCY', 16))
+OPENAI_TOKENS_PER_MINUTE = int(os.getenv('OPENAI_TOKENS_PER_MINUTE', 0))  # 0 disables client-side pacing
+AI_CHAT_CACHE_ENABLED = os.getenv('AI_CHAT_CACHE_ENABLED', 'True') == 'True'
+AI_CHAT_CACHE_SIZE = int(os.getenv('AI_CHAT_CACHE_SIZE', 5000))
+AI_CHAT_CACHE_TTL = int(os.getenv('AI_CHAT_CACHE_TTL', 24 * 60 * 60))
+AI_CHAT_CACHE_SIMILARITY = float(os.getenv('AI_CHAT_CACHE_SIMILARITY')) if os.getenv('AI_CHAT_CACHE_SIMILARITY') else None  # e.g. 0.95
+AI_RETRIEVAL_ENABLED = os.getenv('AI_RETRIEVAL_ENABLED', 'True') == 'True'
+AI_RETRIEVAL_INDEX_DIR = os.getenv('AI_RETRIEVAL_INDEX_DIR', os.path.join(BASE_DIR, 'indexes', 'lessons'))
+AI_RETRIEVAL_CHUNK_WORDS = int(os.getenv('AI_RETRIEVAL_CHUNK_WORDS', 150))
+AI_RETRIEVAL_TOP_K = int(os.getenv('AI_RETRIEVAL_TOP_K', 3))
+AI_RETRIEVAL_CONTEXT_TOKENS = int(os.getenv('AI_RETRIEVAL_CONTEXT_TOKENS', 800))
+AI_TTS_CACHE_DIR = os.getenv('AI_TTS_CACHE_DIR', os.path.join(MEDIA_ROOT, 'tts'))
+AI_TTS_CACHE_MAX_BYTES = int(os.getenv('AI_TTS_CACHE_MAX_BYTES', 500 * 1024 * 1024))
+AI_TTS_MAX_WORKERS = int(os.getenv('AI_TTS_MAX_WORKERS', 8))
+AI_TTS_PARALLEL_CHUNKS = int(os.getenv('AI_TTS_PARALLEL_CHUNKS', 3))
+AI_TTS_CHUNK_CHARS = int(os.getenv('AI_TTS_CHUNK_CHARS', 600))
+AI_TTS_FIRST_CHUNK_CHARS = int(os.getenv('AI_TTS_FIRST_CHUNK_CHARS', 200))
+AI_GRADING_MODEL = os.getenv('AI_GRADING_MODEL', 'gpt-4o')  # Must support JSON output mode
+AI_GRADING_BATCH_SIZE = int(os.getenv('AI_GRADING_BATCH_SIZE', 5))
+AI_GRADING_MAX_WORKERS = int(os.getenv('AI_GRADING_MAX_WORKERS', 4))
+AI_GRADING_CACHE_ENABLED = os.getenv('AI_GRADING_CACHE_ENABLED', 'True') == 'True'
+AI_GRADING_CACHE_SIMILARITY = float(os.getenv('AI_GRADING_CACHE_SIMILARITY')) if os.getenv('AI_GRADING_CACHE_SIMILARITY') else None  # e.g. 0.97
+AI_GRADING_QUEUE_ENABLED = os.getenv('AI_GRADING_QUEUE_ENABLED', 'True') == 'True'  # Grade in manage.py grading_worker
+AI_GRADING_JOBS_PER_CLAIM = int(os.getenv('AI_GRADING_JOBS_PER_CLAIM', 10))
+AI_GRADING_JOB_MAX_TRIES = int(os.getenv('AI_GRADING_JOB_MAX_TRIES', 3))
+AI_GRADING_JOB_TIMEOUT = int(os.getenv('AI_GRADING_JOB_TIMEOUT', 600))  # Seconds before a running job is requeued
@@ -3,5 +3,16 @@
 # Start Nginx
 nginx
 
-# Start Gunicorn
-gunicorn --bind 0.0.0.0:8000 backend.wsgi:application 
\ No newline at end of file
+# Start the grading worker: with AI_GRADING_QUEUE_ENABLED (the default) the
+# grade endpoint only queues jobs, and this process grades them
+if [ "${AI_GRADING_QUEUE_ENABLED:-True}" = "True" ]; then
+    python manage.py grading_worker &
+fi
+
+# Start the app server: SERVER_MODE=asgi runs uvicorn workers so the async
+# AI endpoints (api/ai/async/...) can serve many slow OpenAI calls per worker
+if [ "$SERVER_MODE" = "asgi" ]; then
+    gunicorn --bind 0.0.0.0:8000 --workers "${WEB_CONCURRENCY:-1}" -k uvicorn_worker.UvicornWorker backend.asgi:application
+else
+    gunicorn --bind 0.0.0.0:8000 --workers "${WEB_CONCURRENCY:-1}" backend.wsgi:application
+fi
\ No newline at end of file